@@ -0,0 +1,349 @@
+import time
+import calendar
+import logging
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# ---------- Сводный индекс по месяцам ----------
+# budget_index.json хранится по столбцам:
+# {"version": 3,
+#  "names": {"expenses": [имя, ...], "income": [...], "accounts": [...]},
+#  "months": {"2026-10": {"expenses": [сумма по строкам names], ...}},
+#  "etags": {"2026-10": etag документа месяца или null},
+#  "missing": {"2026-03": когда документа не оказалось, unix-время}}
+# В памяти столбец месяца — array('q'), строка i — статья names[field][i];
+# хвост из нулей в столбце не храним. Индекс правится на каждую операцию —
+# только затронутые статьи; месяцы, которых в нём нет, дочитываются через
+# кэш документов параллельно.
+# Индекс и документы выгружаются порознь, и после сбоя между выгрузками
+# столбец может разойтись с документом. Поэтому при запросе месяц сверяется
+# с документом по etag (не чаще раза в ttl кэша документов) и при
+# расхождении перечитывается; null — месяц правили, а документ ещё не
+# выгружен, такой столбец перечитывается всегда. Отметка «документа нет»
+# живёт missing_ttl секунд.
+
+INDEX_NAME = 'budget_index.json'
+INDEX_VERSION = 3
+FIELDS = ('expenses', 'income', 'accounts')
+ANALYTICS_PREFIXES = ('итоги', 'категори', 'динамика')
+NO_ACCOUNT = 'без счёта'
+
+
+def month_key(month_name, year):
+    return f'{year}-{list(calendar.month_name).index(month_name):02d}'
+
+
+def month_filename(key):
+    year, month = key.split('-')
+    return f'budget_{calendar.month_name[int(month)]}_{year}.json'
+
+
+def month_entry(budget):
+    return {
+        'expenses': {exp.name: exp.amount for exp in budget.expenses},
+        'income': {inc.name: inc.amount for inc in budget.income},
+        'accounts': dict(budget.accounts),
+    }
+
+
+class Rollup:
+    __slots__ = ('names', 'rows', 'months', 'etags', 'missing')
+
+    def __init__(self):
+        self.names = {field: [] for field in FIELDS}   # статьи в порядке появления
+        self.rows = {field: {} for field in FIELDS}    # имя -> номер строки
+        self.months = {}                               # месяц -> {field: array('q')}
+        self.etags = {}                                # месяц -> etag документа, по которому собран
+        self.missing = {}                              # месяц -> когда его не нашлось в хранилище
+
+    def _row(self, field, name):
+        row = self.rows[field].get(name)
+        if row is None:
+            row = self.rows[field][name] = len(self.names[field])
+            self.names[field].append(name)
+        return row
+
+    def set(self, key, field, name, amount):
+        column = self.months[key][field]
+        row = self._row(field, name)
+        if row >= len(column):
+            if not amount:
+                return
+            column.frombytes(bytes(8 * (row + 1 - len(column))))
+        column[row] = amount
+
+    def set_column(self, key, field, amounts):
+        # amounts — dict имя -> сумма; столбец собирается заново
+        self.months.setdefault(key, {})[field] = array('q')
+        for name, amount in amounts.items():
+            self.set(key, field, name, amount)
+
+    def set_month(self, key, entry, etag=None):
+        self.missing.pop(key, None)
+        self.etags[key] = etag
+        for field in FIELDS:
+            self.set_column(key, field, entry[field])
+
+    def forget(self, key):
+        self.months.pop(key, None)
+        self.etags.pop(key, None)
+        self.missing.pop(key, None)
+
+    def set_missing(self, key, now):
+        self.months[key] = {field: array('q') for field in FIELDS}
+        self.etags.pop(key, None)
+        self.missing[key] = now
+
+    # ---------- Матрица «статья × месяц» ----------
+    def matrix(self, field, keys):
+        # Столбцы месяцев раскладываются срезами array, без обхода статей
+        names = list(self.names[field])
+        cols = len(keys)
+        values = array('q', bytes(8 * len(names) * cols))
+        for col, key in enumerate(keys):
+            column = self.months.get(key, {}).get(field)
+            if column:
+                values[col:len(column) * cols:cols] = column
+        return names, values, cols
+
+    # ---------- Хранение ----------
+    def to_dict(self):
+        return {
+            'version': INDEX_VERSION,
+            'names': self.names,
+            'months': {key: {field: column.tolist() for field, column in columns.items()}
+                       for key, columns in self.months.items()},
+            'etags': self.etags,
+            'missing': self.missing,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        rollup = cls()
+        if data.get('version') != INDEX_VERSION:
+            # Старый формат — соберём заново по мере запросов
+            return rollup
+        for field in FIELDS:
+            rollup.names[field] = list(data['names'][field])
+            rollup.rows[field] = {name: row for row, name in enumerate(rollup.names[field])}
+        rollup.months = {key: {field: array('q', columns[field]) for field in FIELDS}
+                         for key, columns in data['months'].items()}
+        rollup.etags = dict(data['etags'])
+        rollup.missing = dict(data['missing'])
+        return rollup
+
+
+class RollupIndex:
+    def __init__(self, cache, documents, workers=4, missing_ttl=600.0):
+        self.cache = cache            # DocumentCache для INDEX_NAME, хранит Rollup
+        self.documents = documents    # DocumentCache документов месяцев (Budget)
+        self.workers = workers
+        self.missing_ttl = missing_ttl
+        self._checked = {}            # месяц -> когда etag последний раз сошёлся (monotonic)
+
+    def _load(self):
+        try:
+            rollup = self.cache.get(INDEX_NAME)
+        except FileNotFoundError:
+            rollup = None
+        return rollup if rollup is not None else Rollup()
+
+    # ---------- Инкрементальное обновление ----------
+    def update(self, budget, ops):
+        key = month_key(budget.month, budget.year)
+        with self.cache.locks(INDEX_NAME):
+            rollup = self._load()
+            try:
+                touched = self._apply(rollup, key, budget, ops)
+            except Exception:
+                # Месяц мог остаться обновлённым наполовину — забываем его,
+                # при следующем запросе он перечитается целиком
+                rollup.forget(key)
+                self.cache.put(INDEX_NAME, rollup)
+                raise
+            if touched:
+                self.cache.put(INDEX_NAME, rollup)
+
+    def _apply(self, rollup, key, budget, ops):
+        if key not in rollup.months or key in rollup.missing or any(op['op'] == 'new_month' for op in ops):
+            rollup.set_month(key, month_entry(budget))
+            return True
+        touched = False
+        for op in ops:
+            kind = op['op']
+            if kind in ('expense', 'delete', 'emoji'):
+                if 'name' not in op:
+                    # Старая запись без имени — пересчитываем месяц целиком
+                    rollup.set_month(key, month_entry(budget))
+                    return True
+                exp = budget.expenses.get(op['name'])
+                rollup.set(key, 'expenses', op['name'], 0 if exp is None else exp.amount)
+                touched = True
+            elif kind == 'income':
+                rollup.set(key, 'income', op['name'], budget.income.get(op['name']).amount)
+                touched = True
+        if touched:
+            rollup.set_column(key, 'accounts', budget.accounts)
+            # Документ ещё не выгружен — etag его новой версии пока неизвестен
+            rollup.etags[key] = None
+        return touched
+
+    # ---------- Чтение со сверкой месяцев ----------
+    def months(self, keys):
+        # -> ({field: (names, values, cols)}, [месяц отсутствует])
+        with self.cache.locks(INDEX_NAME):
+            rollup = self._load()
+            stale = [key for key in keys if self._needs_refresh(rollup, key)]
+        if stale:
+            # Индекс не держим, пока качаем: правки текущего месяца не ждут
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                list(pool.map(self._refresh, stale))
+        with self.cache.locks(INDEX_NAME):
+            rollup = self._load()
+            # Матрицы — копии: индекс продолжает меняться в других потоках
+            matrices = {field: rollup.matrix(field, keys) for field in FIELDS}
+            return matrices, [key in rollup.missing for key in keys]
+
+    def _needs_refresh(self, rollup, key):
+        if key in rollup.missing:
+            return time.time() - rollup.missing[key] >= self.missing_ttl
+        if key not in rollup.months:
+            return True
+        checked = self._checked.get(key)
+        return checked is None or time.monotonic() - checked >= self.documents.ttl
+
+    def _refresh(self, key):
+        filename = month_filename(key)
+        try:
+            # Под замком документа: update() правит месяц под ним же, поэтому
+            # прочитанное здесь не перетрёт более свежую правку
+            with self.documents.locks(filename):
+                with self.cache.locks(INDEX_NAME):
+                    rollup = self._load()
+                    known = key in rollup.months and key not in rollup.missing
+                    etag = rollup.etags.get(key)
+                if known and etag is not None and self.documents.etag(filename) == etag:
+                    self._checked[key] = time.monotonic()
+                    return
+                # Через кэш документов: свежие правки видны, уже загруженное не качаем
+                try:
+                    entry = month_entry(self.documents.get(filename))
+                    etag = self.documents.etag(filename)
+                except FileNotFoundError:
+                    entry = None
+                with self.cache.locks(INDEX_NAME):
+                    rollup = self._load()
+                    if entry is None:
+                        rollup.set_missing(key, time.time())
+                    else:
+                        try:
+                            rollup.set_month(key, entry, etag)
+                        except OverflowError:
+                            # Сумма не влезла в int64 — месяц в аналитику не попадёт
+                            logger.exception('Не удалось добавить %s в индекс', key)
+                            rollup.forget(key)
+                    self.cache.put(INDEX_NAME, rollup)
+                self._checked[key] = time.monotonic()
+        except Exception:
+            # Не запоминаем — попробуем в следующий раз, а пока отвечаем тем,
+            # что уже есть в индексе
+            logger.exception('Не удалось прочитать %s для индекса', filename)
+
+
+def row_totals(values, rows, cols):
+    return [sum(values[row * cols:(row + 1) * cols]) for row in range(rows)]
+
+
+def column_totals(values, cols):
+    return [sum(values[col::cols]) for col in range(cols)]
+
+
+def used_rows(names, values, cols):
+    # Статьи из других месяцев в матрице — нулевые строки, их не показываем
+    return [(row, name) for row, name in enumerate(names) if any(values[row * cols:(row + 1) * cols])]
+
+
+# ---------- Запросы ----------
+def is_analytics(text):
+    return text.lower().startswith(ANALYTICS_PREFIXES)
+
+
+def answer(index, text, now):
+    ltext = text.strip().lower()
+    keys = [f'{now.year}-{month:02d}' for month in range(1, now.month + 1)]
+    matrices, missing = index.months(keys)
+    labels = [calendar.month_name[month] for month in range(1, now.month + 1)]
+    if ltext.startswith('итоги'):
+        return year_to_date(now.year, labels, matrices)
+    if ltext.startswith('категории'):
+        return categories(now.year, matrices)
+    if ltext.startswith('категория'):
+        parts = text.split(maxsplit=1)
+        if len(parts) < 2:
+            return '❌ Укажи название: категория <название>'
+        return category(parts[1].strip(), labels, matrices)
+    return trend(labels, matrices, missing)
+
+
+def year_to_date(year, labels, matrices):
+    _, expenses, _ = matrices['expenses']
+    _, income, _ = matrices['income']
+    accounts, by_account, cols = matrices['accounts']
+    spent, earned = sum(expenses), sum(income)
+    text = f"📊 Итоги {year} ({labels[0]} — {labels[-1]})\n\n"
+    text += f"Расходы: {spent} ₽\nДоходы: {earned} ₽\nБаланс: {earned - spent} ₽\n"
+    used = used_rows(accounts, by_account, cols)
+    if used:
+        totals = row_totals(by_account, len(accounts), cols)
+        text += "\n💳 По счетам\n"
+        for row, name in sorted(used, key=lambda item: -totals[item[0]]):
+            text += f"{name or NO_ACCOUNT} — {totals[row]} ₽\n"
+    return text
+
+
+def categories(year, matrices):
+    names, values, cols = matrices['expenses']
+    used = used_rows(names, values, cols)
+    if not used:
+        return f"Расходов за {year} пока нет"
+    totals = row_totals(values, len(names), cols)
+    text = f"📂 Расходы по категориям за {year}\n\n"
+    for idx, (row, name) in enumerate(sorted(used, key=lambda item: -totals[item[0]]), 1):
+        text += f"{idx}. {name} — {totals[row]} ₽\n"
+    return text
+
+
+def category(name, labels, matrices):
+    names, values, cols = matrices['expenses']
+    amounts = ()
+    if name in names:
+        row = names.index(name)
+        amounts = values[row * cols:(row + 1) * cols]
+    if not any(amounts):
+        return f'Расход "{name}" в этом году не найден'
+    text = f'📂 {name} по месяцам\n\n'
+    for label, amount in zip(labels, amounts):
+        if amount:
+            text += f"{label} — {amount} ₽\n"
+    text += f"\nВсего: {sum(amounts)} ₽\n"
+    return text
+
+
+def trend(labels, matrices, missing):
+    _, expenses, cols = matrices['expenses']
+    _, income, _ = matrices['income']
+    spent = column_totals(expenses, cols)
+    earned = column_totals(income, cols)
+    text = "📈 Динамика по месяцам\n\n"
+    previous = None
+    for label, absent, out, inc in zip(labels, missing, spent, earned):
+        if absent:
+            continue
+        line = f"{label}: расходы {out} ₽"
+        if previous:
+            line += f" ({(out - previous) * 100 / previous:+.0f}%)"
+        text += line + f", доходы {inc} ₽\n"
+        previous = out
+    return text
@@ -0,0 +1,105 @@
+"""Пропускная способность пакетного ввода: строк в секунду.
+
+Сравнивает пакет (одна загрузка, одна выгрузка на сообщение) с вводом по
+одной строке, где каждая строка — отдельный цикл загрузка-правка-выгрузка.
+Хранилища — заглушки в памяти и локальный журнал во временном каталоге.
+
+Запуск из корня репозитория:  python benchmarks/bench_batch.py
+"""
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from budget import Budget  # noqa: E402
+from cache import DocumentCache  # noqa: E402
+from commands import run_batch  # noqa: E402
+from storage import LogStorage  # noqa: E402
+
+FILENAME = 'budget_October_2026.json'
+LINES = 5_000
+
+
+class MemoryStorage:
+    # Заглушка Яндекс.Диска: документ целиком, считаем выгрузки и байты
+    def __init__(self):
+        self.files = {}
+        self.saves = 0
+        self.bytes = 0
+
+    def fetch(self, name):
+        if name not in self.files:
+            raise FileNotFoundError(name)
+        return json.loads(self.files[name]), str(len(self.files[name]))
+
+    def save(self, name, payload, ops=None):
+        self.files[name] = payload
+        self.saves += 1
+        self.bytes += len(payload)
+        return str(len(payload))
+
+    def stat(self, name):
+        return str(len(self.files[name])) if name in self.files else None
+
+    def close(self):
+        pass
+
+
+def make_lines(count):
+    names = [f'статья{idx}' for idx in range(200)]
+    lines = []
+    for _ in range(count):
+        if random.random() < 0.8:
+            lines.append(f'расход {random.randint(1, 5000)} {random.choice(names)} аванс')
+        else:
+            lines.append(f'доход {random.randint(1, 50000)} {random.choice(names)}')
+    return lines
+
+
+def make_cache(storage):
+    cache = DocumentCache(storage, encode=lambda b: json.dumps(b.to_dict(), ensure_ascii=False).encode('utf-8'),
+                          decode=Budget.from_dict, flush_interval=60)
+    cache.put(FILENAME, Budget('October', 2026), [{'op': 'new_month', 'month': 'October', 'year': 2026}])
+    cache.flush()
+    return cache
+
+
+def run(cache, lines, batch_size):
+    started = time.perf_counter()
+    for offset in range(0, len(lines), batch_size):
+        with cache.locks(FILENAME):
+            ops = []
+            data = cache.get(FILENAME)
+            run_batch(data, ops, lines[offset:offset + batch_size])
+            data.report()
+            cache.put(FILENAME, data, ops)
+        cache.flush()
+    return len(lines) / (time.perf_counter() - started)
+
+
+def main():
+    random.seed(1)
+    lines = make_lines(LINES)
+    print(f'{"хранилище":<10} {"строк в пакете":>15} {"строк/с":>12} {"сохранений":>11} {"МБ записано":>12}')
+    for batch_size in (1, 50, 1000):
+        storage = MemoryStorage()
+        cache = make_cache(storage)
+        rate = run(cache, lines, batch_size)
+        print(f'{"память":<10} {batch_size:>15} {rate:>12.0f} {cache.stats["flushes"]:>11} '
+              f'{storage.bytes / 1e6:>12.2f}')
+    for batch_size in (1, 50, 1000):
+        with tempfile.TemporaryDirectory() as directory:
+            storage = LogStorage(directory)
+            cache = make_cache(storage)
+            rate = run(cache, lines, batch_size)
+            written = storage.stats['log_bytes'] + storage.stats['snapshot_bytes']
+            print(f'{"журнал":<10} {batch_size:>15} {rate:>12.0f} {cache.stats["flushes"]:>11} '
+                  f'{written / 1e6:>12.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Микробенчмарк модели бюджета: стоимость одной команды при 10, 1k и 100k статей.
+
+Запуск из корня репозитория:  python benchmarks/bench_budget.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from budget import Budget  # noqa: E402
+from operations import apply_operation  # noqa: E402
+
+SIZES = (10, 1_000, 100_000)
+
+
+def make_budget(size):
+    budget = Budget('October', 2026)
+    for idx in range(size):
+        budget.add_expense(f'статья{idx}', idx, '💸', '')
+        budget.add_income(f'доход{idx}', idx)
+    budget.report()
+    return budget
+
+
+def per_call(fn, repeat):
+    started = time.perf_counter()
+    for idx in range(repeat):
+        fn(idx)
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def bench(size):
+    budget = make_budget(size)
+    middle = f'статья{size // 2}'
+    repeat = 2000 if size <= 1_000 else 50
+    results = {
+        # расход по существующей статье + отчёт, как в handle_message
+        'расход': per_call(lambda i: (apply_operation(budget, {'op': 'expense', 'name': middle, 'amount': 1}),
+                                      budget.report()), repeat),
+        'доход': per_call(lambda i: (apply_operation(budget, {'op': 'income', 'name': 'доход0', 'amount': 1}),
+                                     budget.report()), repeat),
+        'только правка': per_call(lambda i: apply_operation(budget, {'op': 'expense', 'name': middle, 'amount': 1}),
+                                  repeat),
+    }
+
+    def delete_and_restore(i):
+        # Удаляем ту статью, что сейчас посередине, и дописываем её в конец:
+        # размер тот же, а удаление каждый раз из середины, а не последней
+        order = budget.expenses.order
+        name = order[len(order) // 2]
+        apply_operation(budget, {'op': 'delete', 'name': name})
+        budget.add_expense(name, 1, '💸', '')
+        budget.report()
+    results['удали'] = per_call(delete_and_restore, max(repeat // 10, 5))
+    return results
+
+
+def main():
+    print(f"{'статей':>8}  " + '  '.join(f'{name:>14}' for name in ('расход', 'доход', 'только правка', 'удали')))
+    for size in SIZES:
+        results = bench(size)
+        print(f'{size:>8}  ' + '  '.join(f'{results[name]:>11.1f} мкс' for name in
+                                          ('расход', 'доход', 'только правка', 'удали')))
+
+
+if __name__ == '__main__':
+    main()
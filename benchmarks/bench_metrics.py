@@ -0,0 +1,70 @@
+"""Накладные расходы метрик на один апдейт.
+
+В потоке обработчика апдейт проходит шесть замеряемых этапов (update, load,
+command_parse, execute, telegram_reply, render); выгрузка на Диск и правка
+отчёта идут в фоне. Скрипт прогоняет столько же пустых timer() с выключенными
+и включёнными метриками и печатает цену в микросекундах на апдейт.
+Выключенные метрики стоят ровно столько, сколько сам оператор with.
+Прогон длинный, поэтому в цену включённых входит и раскладка замеров по
+корзинам (раз в FOLD_EVERY замеров этапа).
+Порог на разницу проверяет tests/test_metrics.py, здесь — только отчёт.
+
+Запуск из корня репозитория:  python benchmarks/bench_metrics.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import Metrics  # noqa: E402
+
+STAGES = ('update', 'load', 'command_parse', 'execute', 'telegram_reply', 'render')
+UPDATES = 50_000
+REPEATS = 5
+
+
+def best(run):
+    # Минимум из нескольких прогонов — меньше шума от планировщика
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) / UPDATES * 1e6)
+    return min(timings)
+
+
+def per_update(registry):
+    timer = registry.timer
+
+    def run():
+        for _ in range(UPDATES):
+            for stage in STAGES:
+                with timer(stage):
+                    pass
+    return best(run)
+
+
+def baseline():
+    # Тот же цикл без метрик — его вычитаем из замеров
+    def run():
+        for _ in range(UPDATES):
+            for stage in STAGES:
+                pass
+    return best(run)
+
+
+def main():
+    empty = baseline()
+    disabled = per_update(Metrics(enabled=False)) - empty
+    enabled_registry = Metrics(enabled=True)
+    enabled = per_update(enabled_registry) - empty
+    print(f"{'режим':<12}{'мкс/апдейт':>12}{'этапов':>8}")
+    print(f"{'выключены':<12}{disabled:>12.2f}{len(STAGES):>8}")
+    print(f"{'включены':<12}{enabled:>12.2f}{len(STAGES):>8}")
+    print(f"{'разница':<12}{enabled - disabled:>12.2f}{len(STAGES):>8}")
+    print(f"\nстрок в /metrics: {enabled_registry.render().count(chr(10))}")
+
+
+if __name__ == '__main__':
+    main()
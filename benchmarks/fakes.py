@@ -0,0 +1,258 @@
+"""Локальные заглушки Telegram Bot API и Яндекс.Диска для нагрузочных тестов.
+
+Обе заглушки — HTTP-серверы на стандартной библиотеке, каждый в своём потоке.
+Перед ответом сервер ждёт latency секунд (плюс случайно до jitter) — так
+имитируется сеть до настоящих сервисов. Каждый сервер считает вызовы по
+методам и переданные байты (тела запросов и ответов).
+
+FakeTelegram отвечает на getUpdates (long polling), sendMessage,
+editMessageText, deleteMessage и служебные getMe/deleteWebhook. Апдейты
+приходят из групповых чатов, поэтому reply_text бота отвечает с
+reply_to_message_id. По нему ответ сопоставляется с апдейтом и считается
+задержка «апдейт → ответ».
+
+FakeYandexDisk реализует resources/upload, resources/download и resources
+(md5) так же, как REST API Диска: сначала ссылка href, затем PUT/GET по ней.
+"""
+import json
+import time
+import random
+import hashlib
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, quote
+
+MESSAGE_LIMIT = 4096
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'   # keep-alive, как у настоящих сервисов
+
+    def _serve(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        status, payload = self.server.fake.handle(self.command, self.path, body)
+        self.server.fake.delay()
+        self.server.fake.count_bytes(len(body) + len(payload))
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST = do_PUT = _serve
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeServer:
+    def __init__(self, latency=0.0, jitter=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = Counter()
+        self.bytes = 0
+        self._server = None
+
+    # ---------- Запуск ----------
+    def start(self, host='127.0.0.1', port=0):
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        threading.Thread(target=self._server.serve_forever, name=type(self).__name__, daemon=True).start()
+        return self
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    # ---------- Учёт и задержка ----------
+    def delay(self):
+        if self.latency or self.jitter:
+            with self._lock:
+                extra = self._rng.uniform(0, self.jitter) if self.jitter else 0.0
+            time.sleep(self.latency + extra)
+
+    def count(self, method):
+        with self._lock:
+            self.calls[method] += 1
+
+    def count_bytes(self, size):
+        with self._lock:
+            self.bytes += size
+
+    def reset_counters(self):
+        with self._lock:
+            self.calls.clear()
+            self.bytes = 0
+
+    def handle(self, verb, path, body):
+        raise NotImplementedError
+
+
+def _json(status, payload):
+    return status, json.dumps(payload, ensure_ascii=False).encode('utf-8')
+
+
+# ---------- Telegram Bot API ----------
+class FakeTelegram(FakeServer):
+    BOT_ID = 1
+
+    def __init__(self, latency=0.0, jitter=0.0, seed=0):
+        super().__init__(latency, jitter, seed)
+        self._cond = threading.Condition()
+        self._updates = []          # ещё не забранные ботом апдейты
+        self._next_update = 1
+        self._next_message = 1
+        self._pushed = {}           # message_id апдейта -> время отправки
+        self.latencies = []         # секунды от апдейта до ответа на него
+        self.first_push = None
+        self.last_reply = None
+        self.rejected = 0           # сообщения длиннее лимита Telegram
+
+    def push(self, chat_id, text):
+        # Сообщение пользователя в групповом чате chat_id
+        with self._cond:
+            message_id = self._next_message
+            self._next_message += 1
+            self._updates.append({
+                'update_id': self._next_update,
+                'message': {
+                    'message_id': message_id,
+                    'date': int(time.time()),
+                    'chat': {'id': chat_id, 'type': 'group', 'title': f'load {chat_id}'},
+                    'from': {'id': 1000 + abs(chat_id), 'is_bot': False, 'first_name': 'Load'},
+                    'text': text,
+                },
+            })
+            self._next_update += 1
+            now = time.monotonic()
+            self._pushed[message_id] = now
+            if self.first_push is None:
+                self.first_push = now
+            self._cond.notify_all()
+        return message_id
+
+    def wait_replies(self, count, timeout):
+        # Ждём ответов на count апдейтов; возвращает, сколько пришло
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while len(self.latencies) < count:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                self._cond.wait(left)
+            return len(self.latencies)
+
+    def handle(self, verb, path, body):
+        method = path.rsplit('/', 1)[-1].split('?', 1)[0]
+        self.count(method)
+        params = json.loads(body) if body else {}
+        if method == 'getUpdates':
+            return _json(200, {'ok': True, 'result': self._get_updates(params)})
+        if method == 'getMe':
+            return _json(200, {'ok': True, 'result': {
+                'id': self.BOT_ID, 'is_bot': True, 'first_name': 'Budget', 'username': 'budget_load_bot'}})
+        if method in ('sendMessage', 'editMessageText'):
+            text = params.get('text', '')
+            if len(text) > MESSAGE_LIMIT:
+                with self._lock:
+                    self.rejected += 1
+                return _json(400, {'ok': False, 'error_code': 400,
+                                   'description': 'Bad Request: message is too long'})
+            if method == 'sendMessage':
+                self._reply(params.get('reply_to_message_id'))
+            return _json(200, {'ok': True, 'result': self._message(params)})
+        # deleteMessage, deleteWebhook и прочее — просто успех
+        return _json(200, {'ok': True, 'result': True})
+
+    def _get_updates(self, params):
+        offset = int(params.get('offset') or 0)
+        deadline = time.monotonic() + float(params.get('timeout') or 0)
+        with self._cond:
+            # Подтверждённые ботом апдейты (id < offset) больше не отдаём
+            self._updates = [u for u in self._updates if u['update_id'] >= offset]
+            while not self._updates:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                self._cond.wait(left)
+            return self._updates[:int(params.get('limit') or 100)]
+
+    def _reply(self, reply_to):
+        if reply_to is None:
+            return
+        now = time.monotonic()
+        with self._cond:
+            pushed = self._pushed.pop(int(reply_to), None)
+            if pushed is None:
+                return
+            self.latencies.append(now - pushed)
+            self.last_reply = now
+            self._cond.notify_all()
+
+    def _message(self, params):
+        with self._cond:
+            message_id = params.get('message_id')
+            if message_id is None:
+                message_id = self._next_message
+                self._next_message += 1
+        chat_id = int(params.get('chat_id'))
+        return {
+            'message_id': int(message_id),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'group', 'title': f'load {chat_id}'},
+            'from': {'id': self.BOT_ID, 'is_bot': True, 'first_name': 'Budget'},
+            'text': params.get('text', ''),
+        }
+
+
+# ---------- Яндекс.Диск ----------
+class FakeYandexDisk(FakeServer):
+    def __init__(self, latency=0.0, jitter=0.0, seed=0):
+        super().__init__(latency, jitter, seed)
+        self.files = {}             # путь -> bytes
+
+    def put_file(self, path, payload: bytes):
+        # Заранее положить документ (например, большой месяц), без учёта в счётчиках
+        self.files[path] = payload
+
+    def handle(self, verb, path, body):
+        parts = urlsplit(path)
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        route = parts.path
+        if route.endswith('/resources/upload'):
+            self.count('upload_href')
+            return _json(200, {'href': f'{self.url}/upload?path={quote(query["path"])}', 'method': 'PUT'})
+        if route.endswith('/resources/download'):
+            self.count('download_href')
+            if query['path'] not in self.files:
+                return _json(404, {'error': 'DiskNotFoundError'})
+            return _json(200, {'href': f'{self.url}/download?path={quote(query["path"])}', 'method': 'GET'})
+        if route.endswith('/resources'):
+            self.count('stat')
+            payload = self.files.get(query['path'])
+            if payload is None:
+                return _json(404, {'error': 'DiskNotFoundError'})
+            return _json(200, {'md5': hashlib.md5(payload).hexdigest()})
+        if route == '/upload' and verb == 'PUT':
+            self.count('put')
+            self.files[query['path']] = body
+            return 201, b''
+        if route == '/download':
+            self.count('get')
+            payload = self.files.get(query['path'])
+            if payload is None:
+                return _json(404, {'error': 'DiskNotFoundError'})
+            return 200, payload
+        return _json(404, {'error': 'NotFound'})
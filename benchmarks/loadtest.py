@@ -0,0 +1,305 @@
+"""Сквозной нагрузочный тест бота на локальных заглушках Telegram и Диска.
+
+Бот запускается целиком, как в проде (polling, пул обработчиков, кэш,
+публикатор отчёта). Вместо api.telegram.org и cloud-api.yandex.net ему
+подставляются заглушки из fakes.py с заданной задержкой сети. Сценарий —
+детерминированный (seed) поток сообщений из групповых чатов. Каждый сценарий
+идёт в отдельном процессе, чтобы кэши и потоки одного прогона не влияли на
+следующий.
+
+На каждый сценарий печатается:
+  апд/с        — апдейтов в секунду от первого апдейта до последнего ответа;
+  p50/p99      — задержка «апдейт → ответ бота» (reply_text), мс;
+  TG/апд       — вызовов Bot API на апдейт (send/edit/delete, без getUpdates);
+  Диск/апд     — HTTP-вызовов к Диску на апдейт, включая выгрузку при остановке;
+  КБ/апд       — байт через обе заглушки на апдейт (тела запросов и ответов);
+  без ответа   — апдейты, на которые бот не ответил за REPLY_TIMEOUT.
+
+Сценарии с равномерным потоком показывают задержку при заданной нагрузке,
+а пропускная способность упирается в темп отправки. Предел бота видно в
+bursty, где всплески идут разом.
+
+Запуск из корня репозитория:
+  python benchmarks/loadtest.py                          # все сценарии
+  python benchmarks/loadtest.py bursty --repeat 3        # медиана из трёх
+  python benchmarks/loadtest.py --save base.json         # сохранить результат
+  python benchmarks/loadtest.py --baseline base.json     # сравнить с ним
+  python benchmarks/loadtest.py --env CACHE_FLUSH_INTERVAL=0 --storage log
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fakes import FakeTelegram, FakeYandexDisk  # noqa: E402
+
+TOKEN = '123456:LOADTEST'
+YANDEX_DIR = 'loadtest'
+CATEGORIES = 20
+EMOJIS = [chr(0x1F345 + i) for i in range(40)]
+POLL_TIMEOUT = 1
+REPLY_TIMEOUT = 120
+TELEGRAM_CALLS = ('sendMessage', 'editMessageText', 'deleteMessage')
+METRIC_FIELDS = ('throughput', 'p50_ms', 'p99_ms', 'tg_per_update', 'disk_per_update', 'kb_per_update')
+
+
+# ---------- Сценарии ----------
+# Сценарий: (сколько статей в месяце заранее, генератор событий, описание).
+# Генератор возвращает [(секунда от старта, chat_id, текст)].
+def entry_text(rng, names):
+    if rng.random() < 0.1:
+        return f'доход {rng.randint(1000, 50000)} зарплата'
+    return f'расход {rng.randint(50, 5000)} {rng.choice(names)}'
+
+
+def paced(messages, rate):
+    return [(idx / rate, chat_id, text) for idx, (chat_id, text) in enumerate(messages)]
+
+
+def many_chats(rng, names):
+    chats = [-1000 - idx for idx in range(150)]
+    rng.shuffle(chats)
+    return paced([(chat_id, entry_text(rng, names)) for chat_id in chats], rate=5)
+
+
+def bursty(rng, names):
+    events = []
+    for burst in range(5):
+        for chat_id in range(-2000, -2010, -1):
+            events.extend((burst * 3.0, chat_id, entry_text(rng, names)) for _ in range(3))
+    return events
+
+
+def large_month(rng, names):
+    chats = range(-3000, -3010, -1)
+    return paced([(rng.choice(chats), entry_text(rng, names)) for _ in range(100)], rate=4)
+
+
+def rollover(rng, names):
+    chats = range(-4000, -4020, -1)
+    messages = []
+    for idx in range(150):
+        messages.append((rng.choice(chats), 'новый месяц' if idx % 25 == 24 else entry_text(rng, names)))
+    return paced(messages, rate=5)
+
+
+SCENARIOS = {
+    'many_chats': (CATEGORIES, many_chats, '150 чатов по одной записи, 5 апд/с'),
+    'bursty': (CATEGORIES, bursty, '10 чатов, 5 всплесков по 3 записи разом раз в 3 с'),
+    'large_month': (3000, large_month, 'месяц на 3000 статей, 10 чатов, 4 апд/с'),
+    'rollover': (CATEGORIES, rollover, 'каждое 25-е сообщение — «новый месяц», 5 апд/с'),
+}
+
+
+def seed_document(now, names):
+    # Месяц с готовыми статьями — чтобы записи шли без запроса смайлика
+    from operations import record
+    from yandex_disk import encode_document
+    ops = []
+    data = record(None, ops, {'op': 'new_month', 'month': now.strftime('%B'), 'year': now.year})
+    for idx, name in enumerate(names):
+        data = record(data, ops, {'op': 'await_emoji', 'name': name, 'amount': 100, 'account': ''})
+        data = record(data, ops, {'op': 'emoji', 'emoji': EMOJIS[idx % len(EMOJIS)], 'name': name})
+    return encode_document(data.to_dict())
+
+
+# ---------- Один прогон сценария (в дочернем процессе) ----------
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def run_scenario(name, opts):
+    seed_expenses, build, _ = SCENARIOS[name]
+    telegram = FakeTelegram(opts.tg_latency / 1000, opts.jitter / 1000, opts.seed).start()
+    disk = FakeYandexDisk(opts.disk_latency / 1000, opts.jitter / 1000, opts.seed).start()
+    os.environ.update({
+        'BOT_TOKEN': TOKEN,
+        'TELEGRAM_API_URL': f'{telegram.url}/bot',
+        'YANDEX_TOKEN': 'loadtest',
+        'YANDEX_DIR': YANDEX_DIR,
+        'YANDEX_API_URL': f'{disk.url}/v1/disk',
+        'STORAGE_BACKEND': opts.storage,
+        'STORAGE_DIR': tempfile.mkdtemp(prefix='budget-loadtest-'),
+        'BOT_MODE': 'polling',
+        'METRICS_PORT': '0',
+    })
+    os.environ.update(dict(item.split('=', 1) for item in opts.env))
+
+    rng = random.Random(opts.seed)
+    now = datetime.now()
+    names = [f'статья{idx}' for idx in range(seed_expenses)]
+    disk.put_file(f'{YANDEX_DIR}/budget_{now.strftime("%B")}_{now.year}.json', seed_document(now, names))
+    events = build(rng, names[:CATEGORIES])
+
+    import bot
+    from metrics import metrics
+    updater = bot.create_updater()
+    bot.start_services(updater.bot)
+    updater.start_polling(poll_interval=0, timeout=POLL_TIMEOUT)
+
+    started = time.monotonic()
+    for at, chat_id, text in events:
+        delay = started + at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        telegram.push(chat_id, text)
+    replied = telegram.wait_replies(len(events), REPLY_TIMEOUT)
+
+    updater.stop()
+    bot.stop_services()
+    telegram.stop()
+    disk.stop()
+
+    updates = len(events)
+    seconds = (telegram.last_reply or started) - (telegram.first_push or started)
+    tg_calls = sum(telegram.calls[method] for method in TELEGRAM_CALLS)
+    disk_calls = sum(disk.calls.values())
+    return {
+        'updates': updates,
+        'lost': updates - replied,
+        'seconds': seconds,
+        'throughput': replied / seconds if seconds > 0 else 0.0,
+        'p50_ms': percentile(telegram.latencies, 0.5) * 1000,
+        'p99_ms': percentile(telegram.latencies, 0.99) * 1000,
+        'tg_per_update': tg_calls / updates,
+        'disk_per_update': disk_calls / updates,
+        'kb_per_update': (telegram.bytes + disk.bytes) / updates / 1024,
+        'rejected': telegram.rejected,
+        'calls': {'telegram': dict(telegram.calls), 'disk': dict(disk.calls)},
+        'stages': metrics.snapshot()['stages'],
+    }
+
+
+# ---------- Запуск сценариев и таблица ----------
+def child_command(name, opts):
+    command = [sys.executable, os.path.abspath(__file__), '--child', name,
+               '--tg-latency', str(opts.tg_latency), '--disk-latency', str(opts.disk_latency),
+               '--jitter', str(opts.jitter), '--storage', opts.storage, '--seed', str(opts.seed)]
+    for item in opts.env:
+        command += ['--env', item]
+    return command
+
+
+def run_isolated(name, opts):
+    proc = subprocess.run(child_command(name, opts), capture_output=True, text=True, cwd=ROOT)
+    if proc.returncode != 0 or not proc.stdout.strip():
+        sys.stderr.write(proc.stderr[-4000:])
+        raise SystemExit(f'сценарий {name} упал (код {proc.returncode})')
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def median_result(runs):
+    result = dict(runs[-1])
+    for field in METRIC_FIELDS + ('seconds', 'lost', 'rejected'):
+        result[field] = statistics.median(run[field] for run in runs)
+    result['runs'] = len(runs)
+    return result
+
+
+def config_of(opts):
+    return {'tg_latency_ms': opts.tg_latency, 'disk_latency_ms': opts.disk_latency,
+            'jitter_ms': opts.jitter, 'storage': opts.storage, 'seed': opts.seed,
+            'repeat': opts.repeat, 'env': sorted(opts.env)}
+
+
+def format_row(label, updates, values, lost):
+    throughput, p50, p99, tg, disk, kb = values
+    return (f"{label:<14}{updates:>6}{throughput:>9.1f}{p50:>9.1f}{p99:>9.1f}"
+            f"{tg:>8.2f}{disk:>10.2f}{kb:>9.2f}{lost:>12}")
+
+
+def format_delta(values, base):
+    cells = []
+    for value, old in zip(values, base):
+        cells.append(f"{(value - old) * 100 / old:+.0f}%" if old else '—')
+    throughput, p50, p99, tg, disk, kb = cells
+    return (f"{'  к базе':<14}{'':>6}{throughput:>9}{p50:>9}{p99:>9}"
+            f"{tg:>8}{disk:>10}{kb:>9}")
+
+
+def print_table(results, opts, baseline=None):
+    print(f"Telegram {opts.tg_latency:g} мс, Диск {opts.disk_latency:g} мс, разброс {opts.jitter:g} мс, "
+          f"хранилище {opts.storage}, seed {opts.seed}, повторов {opts.repeat}"
+          + (f", env {' '.join(opts.env)}" if opts.env else ''))
+    print(f"{'сценарий':<14}{'апд.':>6}{'апд/с':>9}{'p50 мс':>9}{'p99 мс':>9}"
+          f"{'TG/апд':>8}{'Диск/апд':>10}{'КБ/апд':>9}{'без ответа':>12}")
+    base = (baseline or {}).get('results', {})
+    for name, result in results.items():
+        values = [result[field] for field in METRIC_FIELDS]
+        print(format_row(name, result['updates'], values, int(result['lost'])))
+        if name in base:
+            print(format_delta(values, [base[name][field] for field in METRIC_FIELDS]))
+        if result['rejected']:
+            print(f"{'':<14}Telegram отклонил {int(result['rejected'])} сообщений длиннее 4096 символов")
+    if baseline and baseline.get('config') != config_of(opts):
+        print('\n⚠️ Базовый прогон сделан с другими параметрами — сравнение условное')
+
+
+def print_stages(results):
+    for name, result in results.items():
+        print(f"\n{name}: этапы, p50 / p99 мс (оценка по корзинам гистограммы)")
+        for stage, values in result['stages'].items():
+            print(f"  {stage:<28}{values['count']:>8}{values['p50'] * 1000:>10.1f}{values['p99'] * 1000:>10.1f}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Нагрузочный тест бота на локальных заглушках',
+        epilog='сценарии:\n' + '\n'.join(f'  {name:<12} {about}' for name, (_, _, about) in SCENARIOS.items()),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('scenarios', nargs='*', metavar='scenario',
+                        help=f"какие сценарии запускать: {', '.join(SCENARIOS)} (по умолчанию все)")
+    parser.add_argument('--repeat', type=int, default=1, help='прогонов на сценарий, берётся медиана')
+    parser.add_argument('--tg-latency', type=float, default=50, help='задержка Bot API, мс')
+    parser.add_argument('--disk-latency', type=float, default=100, help='задержка Диска, мс')
+    parser.add_argument('--jitter', type=float, default=0, help='случайная добавка к задержке, мс')
+    parser.add_argument('--storage', choices=('yandex', 'log'), default='yandex')
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='переопределить настройку бота из config.py')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--save', metavar='PATH', help='сохранить результат в JSON')
+    parser.add_argument('--baseline', metavar='PATH', help='сравнить с сохранённым результатом')
+    parser.add_argument('--stages', action='store_true', help='показать задержки по этапам обработки')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    opts = parser.parse_args(argv)
+    unknown = [name for name in opts.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"неизвестные сценарии: {', '.join(unknown)}")
+    return opts
+
+
+def main():
+    opts = parse_args()
+    if opts.child:
+        logging.basicConfig(level=logging.WARNING)
+        print(json.dumps(run_scenario(opts.child, opts)))
+        return
+
+    baseline = None
+    if opts.baseline:
+        with open(opts.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    results = {}
+    for name in opts.scenarios or SCENARIOS:
+        results[name] = median_result([run_isolated(name, opts) for _ in range(opts.repeat)])
+    print_table(results, opts, baseline)
+    if opts.stages:
+        print_stages(results)
+    if opts.save:
+        with open(opts.save, 'w', encoding='utf-8') as f:
+            json.dump({'config': config_of(opts), 'results': results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
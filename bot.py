@@ -1,62 +1,99 @@
-import os
-import json
-import requests
+import csv
+import signal
+import logging
 import calendar
+import threading
+from contextlib import ExitStack
 from datetime import datetime
-from dotenv import load_dotenv
 from telegram import Update
 from telegram.ext import Updater, CommandHandler, MessageHandler, Filters, CallbackContext
+from config import (BOT_TOKEN, TELEGRAM_API_URL,
+                    CACHE_FLUSH_INTERVAL, CACHE_TTL, CACHE_MAX_DOCUMENTS,
+                    STORAGE_BACKEND, STORAGE_DIR, LOG_COMPACT_EVERY,
+                    WORKER_POOL_SIZE, WORKER_QUEUE_DEPTH,
+                    BOT_MODE, WEBHOOK_URL, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT,
+                    REPORT_COALESCE_WINDOW, REPORT_CHAT_RATE, REPORT_CHAT_BURST,
+                    REPORT_GLOBAL_RATE, REPORT_WORKERS, ROLLUP_FETCH_WORKERS, ROLLUP_MISSING_TTL,
+                    METRICS_ENABLED, METRICS_PORT, METRICS_LOG_INTERVAL)
+from yandex_disk import encode_document
+from storage import YandexStorage, LogStorage
+from cache import DocumentCache
+from budget import Budget
+from operations import record
+from commands import (CommandError, parse_command, is_command, parse_emojis, csv_lines,
+                      execute, emoji_prompt, run_batch)
+from workers import KeyedLocks, ChatExecutor
+from webhook import create_app
+from publisher import ReportPublisher
+from analytics import Rollup, RollupIndex, is_analytics, answer
+from metrics import metrics
 
-# ---------- Загружаем переменные из .env ----------
-load_dotenv()
-BOT_TOKEN = os.getenv("BOT_TOKEN")
-YANDEX_TOKEN = os.getenv("YANDEX_TOKEN")
-YANDEX_DIR = os.getenv("YANDEX_DIR")
-
-# ---------- Работа с Яндекс.Диском ----------
-def upload_to_yandex(filename, data):
-    url = f'https://cloud-api.yandex.net/v1/disk/resources/upload?path={YANDEX_DIR}/{filename}&overwrite=true'
-    headers = {'Authorization': f'OAuth {YANDEX_TOKEN}'}
-    r = requests.get(url, headers=headers).json()
-    upload_url = r['href']
-    requests.put(upload_url, data=json.dumps(data, ensure_ascii=False).encode('utf-8'))
-
-def download_from_yandex(filename):
-    url = f'https://cloud-api.yandex.net/v1/disk/resources/download?path={YANDEX_DIR}/{filename}'
-    headers = {'Authorization': f'OAuth {YANDEX_TOKEN}'}
-    r = requests.get(url, headers=headers).json()
-    if 'href' not in r:
-        raise FileNotFoundError
-    download_url = r['href']
-    resp = requests.get(download_url)
-    return json.loads(resp.content)
-
-# ---------- Шаблон нового месяца ----------
-def new_month_template(month: str, year: int):
-    return {
-        'month': month,
-        'year': year,
-        'expenses': [],
-        'income': [],
-        'last_message_id': None,
-        'awaiting_emoji': None
-    }
-
-# ---------- Генерация текста бюджета ----------
-def generate_template_text(data):
-    text = f"💸 Расходы/Доходы {data['month']} {data['year']}\n\n"
-    if data['expenses']:
-        for idx, exp in enumerate(data['expenses'], 1):
-            text += f"{idx}. {exp['emoji']} {exp['name']} — {exp['amount']} ₽\n"
-    else:
-        text += "Расходов пока нет\n"
-    text += "\n💰 Доходы\n"
-    if data['income']:
-        for idx, inc in enumerate(data['income'], 1):
-            text += f"{idx}. {inc['name']} — {inc['amount']} ₽\n"
-    else:
-        text += "Доходов пока нет\n"
-    return text
+logger = logging.getLogger(__name__)
+
+LOAD_FAILED = '⚠️ Не удалось загрузить бюджет, попробуй ещё раз чуть позже'
+
+# ---------- Хранилище и кэш документов бюджета ----------
+if STORAGE_BACKEND == 'log':
+    storage = LogStorage(STORAGE_DIR, mirror=YandexStorage(), compact_every=LOG_COMPACT_EVERY)
+else:
+    storage = YandexStorage()
+
+# Документы меняются только под замком document_locks(filename)
+document_locks = KeyedLocks()
+
+documents = DocumentCache(
+    storage,
+    encode=lambda budget: encode_document(budget.to_dict()),
+    decode=Budget.from_dict,
+    locks=document_locks,
+    flush_interval=CACHE_FLUSH_INTERVAL,
+    ttl=CACHE_TTL,
+    max_documents=CACHE_MAX_DOCUMENTS,
+)
+
+# ---------- Сводный индекс для аналитики ----------
+index_cache = DocumentCache(
+    storage,
+    encode=lambda rollup: encode_document(rollup.to_dict()),
+    decode=Rollup.from_dict,
+    locks=document_locks,
+    flush_interval=CACHE_FLUSH_INTERVAL,
+    ttl=CACHE_TTL,
+    max_documents=1,
+)
+rollups = RollupIndex(index_cache, documents, workers=ROLLUP_FETCH_WORKERS,
+                      missing_ttl=ROLLUP_MISSING_TTL)
+
+# ---------- Параллельная обработка ----------
+executor = ChatExecutor(workers=WORKER_POOL_SIZE, queue_depth=WORKER_QUEUE_DEPTH)
+
+# ---------- Отчёт в чате ----------
+def store_report_messages(chat_id, filename, message_ids):
+    # Публикатор поменял состав сообщений отчёта — запоминаем в документе
+    with document_locks(filename):
+        try:
+            data = documents.get(filename)
+        except FileNotFoundError:
+            return
+        ops = []
+        data = record(data, ops, {'op': 'report', 'chat_id': chat_id, 'message_ids': message_ids})
+        save_document(filename, data, ops)
+
+publisher = ReportPublisher(
+    on_messages=store_report_messages,
+    window=REPORT_COALESCE_WINDOW,
+    chat_rate=REPORT_CHAT_RATE,
+    chat_burst=REPORT_CHAT_BURST,
+    global_rate=REPORT_GLOBAL_RATE,
+    workers=REPORT_WORKERS,
+)
+
+# ---------- Метрики ----------
+metrics.add_collector('documents', lambda: documents.stats)
+metrics.add_collector('index', lambda: index_cache.stats)
+metrics.add_collector('publisher', lambda: publisher.stats)
+metrics.add_collector('storage', storage.collect)
+metrics.add_collector('workers', lambda: {'queue_depth': executor.depth()})
 
 # ---------- Команда /start ----------
 def start(update: Update, context: CallbackContext):
@@ -64,127 +101,250 @@ def start(update: Update, context: CallbackContext):
 
 # ---------- Основная обработка сообщений ----------
 def handle_message(update: Update, context: CallbackContext):
-    text = update.message.text.strip()
-    chat_id = update.message.chat_id
+    with metrics.timer('update'):
+        _handle_message(update, context)
+
+def _handle_message(update: Update, context: CallbackContext):
     now = datetime.now()
-    month_name = now.strftime('%B')
-    year = now.year
-    filename = f'budget_{month_name}_{year}.json'
+    filename = f'budget_{now.strftime("%B")}_{now.year}.json'
+
+    # Аналитика только читает индекс — замок документа ей не нужен
+    if is_analytics(update.message.text.strip()):
+        with metrics.timer('analytics'):
+            text = answer(rollups, update.message.text, now)
+        send_reply(update, text)
+        return
+
+    # Весь цикл чтение-правка-запись идёт под замком документа. Документ
+    # месяца общий для всех чатов, поэтому ответы уходят уже после замка —
+    # иначе поход в Telegram выстраивает все чаты в одну очередь
+    with ExitStack() as held:
+        held.enter_context(document_locks(filename))
+        replies = process_message(update, context, now, filename, held)
+    for reply in replies:
+        send_reply(update, reply)
 
-    # Пытаемся загрузить текущие данные
+def load_document(filename, now, ops):
+    # Пытаемся загрузить текущие данные, если файла нет — начинаем месяц.
+    # Любая другая ошибка (сеть, битый JSON) уходит наверх: обнулять месяц
+    # из-за сбоя загрузки нельзя.
     try:
-        data = download_from_yandex(filename)
-    except:
-        data = new_month_template(month_name, year)
-
-    # ---------- Если бот ждёт смайлик ----------
-    if data.get('awaiting_emoji'):
-        emoji = text.strip()[0]
-        new_exp = data['awaiting_emoji']
-        data['expenses'].append({
-            'name': new_exp['name'],
-            'amount': new_exp['amount'],
-            'emoji': emoji,
-            'account': new_exp['account']
-        })
-        data['awaiting_emoji'] = None
-        update.message.reply_text(f'✅ Расход "{new_exp["name"]}" добавлен с смайликом {emoji}')
+        with metrics.timer('load'):
+            return documents.get(filename)
+    except FileNotFoundError:
+        return record(None, ops, {'op': 'new_month', 'month': now.strftime('%B'), 'year': now.year})
+
+def try_load_document(filename, now, ops):
+    try:
+        return load_document(filename, now, ops)
+    except Exception:
+        logger.exception('Не удалось загрузить %s', filename)
+        metrics.error('download')
+        return None
+
+def send_reply(update, text):
+    with metrics.timer('telegram_reply'):
+        update.message.reply_text(text)
+
+def save_document(filename, data, ops):
+    documents.put(filename, data, ops)
+    try:
+        rollups.update(data, ops)
+    except Exception:
+        # Индекс — производные данные: правка уже в журнале, ответ не ломаем.
+        # Месяц индекс перечитает сам, см. RollupIndex
+        logger.exception('Не удалось обновить индекс для %s', filename)
+        metrics.error('index')
+
+def refresh_report(chat_id, filename, data, ops):
+    # Сообщение без команды только переотправляет отчёт: документ не менялся
+    if ops:
+        save_document(filename, data, ops)
+    with metrics.timer('render'):
+        text = data.report()
+    publisher.publish(chat_id, filename, text, data.report_messages.get(str(chat_id)))
+
+def process_message(update: Update, context: CallbackContext, now, filename, held):
+    # Возвращает ответы пользователю. Правки сохраняются здесь же, до любого
+    # обращения к Telegram: сбой отправки не должен оставить в памяти
+    # операции, которых нет в журнале.
+    text = update.message.text.strip()
+    chat_id = update.message.chat_id
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+
+    ops = []
+    data = try_load_document(filename, now, ops)
+    if data is None:
+        return [LOAD_FAILED]
+
+    # ---------- Если бот ждёт смайлики ----------
+    if data.awaiting_emoji and not is_command(text):
+        try:
+            emojis = parse_emojis(text, len(data.awaiting_emoji))
+        except CommandError as e:
+            return [f'{e}\n\n{emoji_prompt(data)}']
+        added = []
+        for emoji in emojis:
+            name = data.awaiting_emoji[0]['name']
+            data = record(data, ops, {'op': 'emoji', 'emoji': emoji, 'name': name})
+            added.append((name, emoji))
+        if len(added) == 1:
+            name, emoji = added[0]
+            reply = f'✅ Расход "{name}" добавлен с смайликом {emoji}'
+        else:
+            reply = '✅ Добавлены расходы: ' + ', '.join(f'"{name}" {emoji}' for name, emoji in added)
+        if data.awaiting_emoji:
+            reply += '\n\n' + emoji_prompt(data)
+
+    # ---------- Пакет команд: по одной на строку ----------
+    elif len(lines) > 1:
+        with metrics.timer('batch'):
+            reply = run_batch(data, ops, lines)
 
     else:
-        ltext = text.lower()
+        try:
+            with metrics.timer('command_parse'):
+                command = parse_command(text)
+        except CommandError as e:
+            return [str(e)]
 
         # ---------- Новый месяц ----------
-        if ltext.startswith('новый месяц'):
+        if command and command['cmd'] == 'new_month':
             month_index = now.month
             year_new = now.year
             next_month_index = 1 if month_index == 12 else month_index + 1
             if month_index == 12:
                 year_new += 1
             month_name = calendar.month_name[next_month_index]
-            data = new_month_template(month_name, year_new)
+            ops = []
+            data = record(None, ops, {'op': 'new_month', 'month': month_name, 'year': year_new})
             filename = f'budget_{month_name}_{year_new}.json'
-            update.message.reply_text(f'Создан новый месяц: {month_name} {year_new}')
-
-        # ---------- Добавление расхода ----------
-        elif ltext.startswith('расход'):
-            parts = text.split()
-            try:
-                amount = int(parts[1])
-                name = parts[2]
-                account = ' '.join(parts[3:]) if len(parts) > 3 else ''
-            except:
-                update.message.reply_text('❌ Ошибка формата. Используй: расход <сумма> <название> [аванс/зарплата]')
-                return
-            # Проверяем, есть ли такой расход
-            for exp in data['expenses']:
-                if exp['name'] == name:
-                    exp['amount'] += amount
-                    update.message.reply_text(f'Обновлён расход "{name}" (+{amount} ₽)')
-                    break
-            else:
-                # Новый расход — ждём смайлик
-                data['awaiting_emoji'] = {'name': name, 'amount': amount, 'account': account}
-                update.message.reply_text(f'Введите смайлик для нового расхода "{name}"')
-                upload_to_yandex(filename, data)
-                return
-
-        # ---------- Добавление дохода ----------
-        elif ltext.startswith('доход'):
-            parts = text.split()
-            try:
-                amount = int(parts[1])
-                name = ' '.join(parts[2:])
-            except:
-                update.message.reply_text('❌ Ошибка формата. Используй: доход <сумма> <название>')
-                return
-            for inc in data['income']:
-                if inc['name'] == name:
-                    inc['amount'] += amount
-                    update.message.reply_text(f'Обновлён доход "{name}" (+{amount} ₽)')
-                    break
-            else:
-                data['income'].append({'name': name, 'amount': amount})
-                update.message.reply_text(f'Добавлен новый доход "{name}"')
+            held.enter_context(document_locks(filename))
+            reply = f'Создан новый месяц: {month_name} {year_new}'
 
         # ---------- Отчёт ----------
-        elif ltext == 'отчёт':
-            text_out = generate_template_text(data)
-            update.message.reply_text(text_out)
-            return
+        elif command and command['cmd'] == 'report':
+            with metrics.timer('render'):
+                return [data.report()]
 
-        # ---------- Удаление расхода ----------
-        elif ltext.startswith('удали'):
-            parts = text.split()
-            if len(parts) < 2:
-                update.message.reply_text('❌ Укажи название: удали <название>')
-                return
-            name = parts[1]
-            before = len(data['expenses'])
-            data['expenses'] = [x for x in data['expenses'] if x['name'] != name]
-            if len(data['expenses']) < before:
-                update.message.reply_text(f'Удалён расход "{name}"')
-            else:
-                update.message.reply_text(f'Расход "{name}" не найден')
-
-    # ---------- Отправляем обновлённый шаблон ----------
-    text_template = generate_template_text(data)
-    if data.get('last_message_id'):
-        try:
-            context.bot.delete_message(chat_id=chat_id, message_id=data['last_message_id'])
-        except:
-            pass
-    msg = update.message.reply_text(text_template)
-    data['last_message_id'] = msg.message_id
-    upload_to_yandex(filename, data)
+        # ---------- Расход, доход, удаление ----------
+        elif command:
+            with metrics.timer('execute'):
+                reply = execute(data, ops, command)
+            if command['cmd'] == 'expense' and command['name'] not in data.expenses:
+                # Новый расход попадёт в отчёт после смайлика
+                save_document(filename, data, ops)
+                return [reply]
+
+        else:
+            reply = None
+
+    # ---------- Сохраняем и обновляем отчёт в чате ----------
+    refresh_report(chat_id, filename, data, ops)
+    return [reply] if reply is not None else []
+
+# ---------- Импорт CSV ----------
+def handle_document(update: Update, context: CallbackContext):
+    now = datetime.now()
+    filename = f'budget_{now.strftime("%B")}_{now.year}.json'
+    chat_id = update.message.chat_id
+    payload = update.message.document.get_file().download_as_bytearray()
+    try:
+        lines = csv_lines(bytes(payload))
+    except (UnicodeDecodeError, csv.Error):
+        update.message.reply_text('❌ Не удалось прочитать CSV: нужен текст в UTF-8')
+        return
+    if not lines:
+        update.message.reply_text('❌ В файле нет строк')
+        return
+
+    # Весь файл — одна транзакция, как пакет строк в сообщении
+    with document_locks(filename):
+        ops = []
+        data = try_load_document(filename, now, ops)
+        if data is None:
+            summary = LOAD_FAILED
+        else:
+            with metrics.timer('batch'):
+                summary = run_batch(data, ops, lines)
+            refresh_report(chat_id, filename, data, ops)
+    send_reply(update, summary)
 
 # ---------- Запуск ----------
-def main():
-    updater = Updater(BOT_TOKEN)
+def start_webhook(updater):
+    # Регистрирует вебхук и запускает диспетчер; Flask-приложение отдаётся
+    # серверу — встроенному (run_webhook) или WSGI (wsgi.py)
     dp = updater.dispatcher
-    dp.add_handler(CommandHandler("start", start))
-    dp.add_handler(MessageHandler(Filters.text & ~Filters.command, handle_message))
-    updater.start_polling()
-    updater.idle()
+    app = create_app(dp, WEBHOOK_SECRET, executor)
+    updater.bot.set_webhook(url=f'{WEBHOOK_URL}/webhook', secret_token=WEBHOOK_SECRET)
+    thread = threading.Thread(target=dp.start, name='dispatcher', daemon=True)
+    thread.start()
+    return app, thread
+
+def stop_webhook(updater, thread):
+    updater.dispatcher.stop()
+    thread.join()
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+def run_webhook(updater):
+    # Отладочный сервер Werkzeug; в проде — WSGI-сервер через wsgi.py
+    app, thread = start_webhook(updater)
+    # Werkzeug останавливается только по KeyboardInterrupt, а docker stop и
+    # systemd шлют SIGTERM — без перехвата процесс умер бы, не выгрузив документы
+    previous = {sig: signal.signal(sig, _interrupt) for sig in (signal.SIGTERM, signal.SIGINT)}
+    try:
+        app.run(host=WEBHOOK_HOST, port=WEBHOOK_PORT, threaded=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Повторный сигнал во время выгрузки завершает процесс сразу
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+        logger.info('Вебхук остановлен, дорабатываем очереди')
+        stop_webhook(updater, thread)
+
+def create_updater():
+    updater = Updater(BOT_TOKEN, base_url=TELEGRAM_API_URL)
+    dp = updater.dispatcher
+    # Сюда копятся апдейты, пока пул занят, — см. ChatExecutor
+    metrics.add_collector('dispatcher', lambda: {'update_queue': dp.update_queue.qsize()})
+    dp.add_handler(CommandHandler("start", executor.wrap(start)))
+    dp.add_handler(MessageHandler(Filters.text & ~Filters.command, executor.wrap(handle_message)))
+    dp.add_handler(MessageHandler(Filters.document.file_extension("csv"), executor.wrap(handle_document)))
+    return updater
+
+def start_services(bot):
+    if METRICS_ENABLED:
+        if BOT_MODE != 'webhook' and METRICS_PORT:
+            # В режиме вебхука /metrics отдаёт то же Flask-приложение
+            metrics.serve(WEBHOOK_HOST, METRICS_PORT)
+        if METRICS_LOG_INTERVAL > 0:
+            metrics.start_logging(METRICS_LOG_INTERVAL)
+    documents.start()
+    index_cache.start()
+    publisher.start(bot)
+    executor.start()
+
+def stop_services():
+    executor.shutdown()
+    publisher.close()
+    documents.close()
+    index_cache.close()
+    storage.close()
+
+def main():
+    updater = create_updater()
+    start_services(updater.bot)
+    try:
+        if BOT_MODE == 'webhook':
+            run_webhook(updater)
+        else:
+            updater.start_polling()
+            updater.idle()
+    finally:
+        stop_services()
 
 if __name__ == "__main__":
     main()
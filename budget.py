@@ -0,0 +1,181 @@
+# ---------- Модель бюджета в памяти ----------
+# Статьи лежат в dict по имени (поиск O(1), порядок вставки = нумерация).
+# Строки отчёта кэшируются: изменение одной статьи переписывает одну строку,
+# удаление перенумеровывает только хвост. В JSON сохраняется прежний формат.
+
+
+class Expense:
+    __slots__ = ('name', 'amount', 'emoji', 'account')
+
+    def __init__(self, name, amount, emoji, account):
+        self.name = name
+        self.amount = amount
+        self.emoji = emoji
+        self.account = account
+
+    def line(self, idx):
+        return f"{idx}. {self.emoji} {self.name} — {self.amount} ₽\n"
+
+    def to_dict(self):
+        return {'name': self.name, 'amount': self.amount, 'emoji': self.emoji, 'account': self.account}
+
+
+class Income:
+    __slots__ = ('name', 'amount')
+
+    def __init__(self, name, amount):
+        self.name = name
+        self.amount = amount
+
+    def line(self, idx):
+        return f"{idx}. {self.name} — {self.amount} ₽\n"
+
+    def to_dict(self):
+        return {'name': self.name, 'amount': self.amount}
+
+
+# ---------- Раздел отчёта: статьи + готовые строки ----------
+class Section:
+    __slots__ = ('items', 'lines', 'order', 'positions', 'empty_text', '_text')
+
+    def __init__(self, empty_text):
+        self.items = {}       # name -> Expense/Income
+        self.lines = []       # готовые строки отчёта с номерами
+        self.order = []       # имена статей в порядке lines
+        self.positions = {}   # name -> индекс в lines
+        self.empty_text = empty_text
+        self._text = None
+
+    def __contains__(self, name):
+        return name in self.items
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items.values())
+
+    def get(self, name):
+        return self.items.get(name)
+
+    def append(self, item):
+        self.positions[item.name] = len(self.lines)
+        self.items[item.name] = item
+        self.order.append(item.name)
+        self.lines.append(item.line(len(self.lines) + 1))
+        self._text = None
+
+    def refresh(self, name):
+        pos = self.positions[name]
+        self.lines[pos] = self.items[name].line(pos + 1)
+        self._text = None
+
+    def remove(self, name):
+        if self.items.pop(name, None) is None:
+            return False
+        pos = self.positions.pop(name)
+        del self.lines[pos]
+        del self.order[pos]
+        # Перенумеровываем только статьи после удалённой
+        for idx in range(pos, len(self.order)):
+            name = self.order[idx]
+            self.positions[name] = idx
+            self.lines[idx] = self.items[name].line(idx + 1)
+        self._text = None
+        return True
+
+    def text(self):
+        if self._text is None:
+            self._text = ''.join(self.lines) if self.lines else self.empty_text
+        return self._text
+
+
+class Budget:
+    __slots__ = ('month', 'year', 'expenses', 'income', 'accounts', 'last_message_id',
+                 'report_messages', 'awaiting_emoji', '_header')
+
+    def __init__(self, month, year):
+        self.month = month
+        self.year = year
+        self.expenses = Section("Расходов пока нет\n")
+        self.income = Section("Доходов пока нет\n")
+        self.accounts = {}          # счёт (аванс/зарплата/'') -> сумма расходов
+        self.last_message_id = None
+        self.report_messages = {}   # str(chat_id) -> id сообщений отчёта в этом чате
+        self.awaiting_emoji = []    # новые расходы, ждущие смайлика, по порядку
+        self._header = f"💸 Расходы/Доходы {month} {year}\n\n"
+
+    # ---------- Изменения ----------
+    def add_expense(self, name, amount, emoji='', account=''):
+        exp = self.expenses.get(name)
+        if exp is None:
+            self.expenses.append(Expense(name, amount, emoji, account))
+        else:
+            exp.amount += amount
+            self.expenses.refresh(name)
+            account = exp.account
+        self.accounts[account] = self.accounts.get(account, 0) + amount
+
+    def add_income(self, name, amount):
+        inc = self.income.get(name)
+        if inc is None:
+            self.income.append(Income(name, amount))
+        else:
+            inc.amount += amount
+            self.income.refresh(name)
+
+    def delete_expense(self, name):
+        exp = self.expenses.get(name)
+        if exp is None:
+            return False
+        self.accounts[exp.account] -= exp.amount
+        return self.expenses.remove(name)
+
+    def await_emoji(self, name, amount, account):
+        for pending in self.awaiting_emoji:
+            if pending['name'] == name:
+                pending['amount'] += amount
+                return
+        self.awaiting_emoji.append({'name': name, 'amount': amount, 'account': account})
+
+    def assign_emoji(self, emoji):
+        # Смайлик достаётся самому раннему из ждущих расходов
+        pending = self.awaiting_emoji.pop(0)
+        self.add_expense(pending['name'], pending['amount'], emoji, pending['account'])
+        return pending
+
+    def set_report_messages(self, chat_id, message_ids):
+        self.report_messages[str(chat_id)] = list(message_ids)
+        # Старые версии бота знают только про одно сообщение
+        self.last_message_id = message_ids[-1] if message_ids else None
+
+    # ---------- Отчёт ----------
+    def report(self):
+        return ''.join((self._header, self.expenses.text(), "\n💰 Доходы\n", self.income.text()))
+
+    # ---------- Совместимость с JSON-форматом ----------
+    @classmethod
+    def from_dict(cls, data):
+        budget = cls(data['month'], data['year'])
+        for exp in data['expenses']:
+            budget.add_expense(exp['name'], exp['amount'], exp.get('emoji', ''), exp.get('account', ''))
+        for inc in data['income']:
+            budget.add_income(inc['name'], inc['amount'])
+        budget.last_message_id = data.get('last_message_id')
+        budget.report_messages = dict(data.get('report_messages') or {})
+        awaiting = data.get('awaiting_emoji') or []
+        budget.awaiting_emoji = [awaiting] if isinstance(awaiting, dict) else list(awaiting)
+        return budget
+
+    def to_dict(self):
+        # Один ждущий расход пишем словарём, как раньше; несколько — списком
+        awaiting = self.awaiting_emoji
+        return {
+            'month': self.month,
+            'year': self.year,
+            'expenses': [exp.to_dict() for exp in self.expenses],
+            'income': [inc.to_dict() for inc in self.income],
+            'last_message_id': self.last_message_id,
+            'report_messages': self.report_messages,
+            'awaiting_emoji': (awaiting[0] if len(awaiting) == 1 else awaiting) or None
+        }
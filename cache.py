@@ -0,0 +1,202 @@
+import time
+import logging
+import threading
+from workers import KeyedLocks
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ('data', 'ops', 'etag', 'checked', 'used', 'dirty', 'version')
+
+    def __init__(self, data, etag, now):
+        self.data = data
+        self.ops = []
+        self.etag = etag
+        self.checked = now
+        self.used = now
+        self.dirty = False
+        self.version = 0
+
+
+# ---------- Кэш документов бюджета ----------
+# Читаем из памяти, сверяемся с Диском (md5) только когда документ устарел.
+# Запись помечает документ грязным, выгрузка — фоновым потоком раз в
+# flush_interval секунд, все правки за интервал уходят одним PUT.
+# Бот считается единственным писателем: грязный документ с Диском не сверяется.
+# Хранилище — любой объект из storage.py (fetch/save/stat).
+# Документы меняются только под locks(name): под тем же замком поток выгрузки
+# сериализует документ, поэтому put() ничего не кодирует сам.
+class DocumentCache:
+    def __init__(self, storage, encode, decode=None, locks=None,
+                 flush_interval=5.0, ttl=30.0, max_documents=3):
+        self.storage = storage
+        self._encode = encode    # документ -> bytes
+        self._decode = decode    # dict из хранилища -> документ
+        self.locks = locks if locks is not None else KeyedLocks()
+        self.flush_interval = flush_interval
+        self.ttl = ttl
+        self.max_documents = max_documents
+        self._entries = {}
+        self._lock = threading.Lock()
+        # Выгрузки идут строго по очереди, иначе журнал получит операции вразнобой
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self.stats = {'hits': 0, 'misses': 0, 'revalidations': 0,
+                      'flushes': 0, 'flush_errors': 0, 'evictions': 0}
+
+    # ---------- Чтение ----------
+    def get(self, name):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                entry.used = now
+                if entry.dirty or now - entry.checked < self.ttl:
+                    self.stats['hits'] += 1
+                    return entry.data
+
+        if entry is not None:
+            try:
+                etag = self.storage.stat(name)
+            except Exception:
+                # Диск недоступен — лучше устаревшая копия, чем пустой месяц
+                logger.exception('Не удалось сверить %s с Диском', name)
+                metrics.error('stat')
+                etag = entry.etag
+            if etag == entry.etag:
+                with self._lock:
+                    entry.checked = now
+                    self.stats['hits'] += 1
+                    self.stats['revalidations'] += 1
+                return entry.data
+
+        try:
+            data, etag = self.storage.fetch(name)
+        except FileNotFoundError:
+            with self._lock:
+                current = self._entries.get(name)
+                if current is not None and current.dirty:
+                    return current.data
+                self._entries.pop(name, None)
+            raise
+        if self._decode is not None:
+            data = self._decode(data)
+
+        with self._lock:
+            current = self._entries.get(name)
+            # Пока качали, документ успели изменить локально — он главнее
+            if current is not None and current.dirty:
+                return current.data
+            self.stats['misses'] += 1
+            self._entries[name] = _Entry(data, etag, now)
+            self._evict()
+        return data
+
+    def etag(self, name):
+        # etag сохранённой версии, с которой совпадает кэш; None — документа
+        # нет в хранилище или в кэше есть невыгруженные правки
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                if entry.dirty:
+                    return None
+                if now - entry.checked < self.ttl:
+                    return entry.etag
+        return self.storage.stat(name)
+
+    # ---------- Запись ----------
+    def put(self, name, data, ops=None):
+        # ops — операции, которые привели к data; None — только целиком
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                entry = self._entries[name] = _Entry(data, None, now)
+            entry.data = data
+            if ops is None or entry.ops is None:
+                entry.ops = None
+            else:
+                entry.ops.extend(ops)
+            entry.dirty = True
+            entry.version += 1
+            entry.checked = entry.used = now
+            self._evict()
+        if self.flush_interval <= 0:
+            self._wake.set()
+
+    def flush(self):
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self):
+        with self._lock:
+            names = [name for name, entry in self._entries.items() if entry.dirty]
+        for name in names:
+            with self.locks(name):
+                with self._lock:
+                    entry = self._entries.get(name)
+                    if entry is None or not entry.dirty:
+                        continue
+                    version, ops = entry.version, entry.ops
+                    entry.ops = []
+                with metrics.timer('encode'):
+                    payload = self._encode(entry.data)
+            try:
+                etag = self.storage.save(name, payload, ops)
+            except Exception:
+                logger.exception('Не удалось выгрузить %s, повторим позже', name)
+                metrics.error('upload')
+                with self._lock:
+                    self.stats['flush_errors'] += 1
+                    # Возвращаем невыгруженные операции в начало очереди
+                    entry.ops = None if ops is None or entry.ops is None else ops + entry.ops
+                continue
+            with self._lock:
+                self.stats['flushes'] += 1
+                # Если за время выгрузки были новые правки — остаёмся грязными
+                if entry.version == version:
+                    entry.dirty = False
+                    entry.etag = etag
+                    entry.checked = time.monotonic()
+        with self._lock:
+            self._evict()
+
+    # ---------- Вытеснение старых месяцев ----------
+    def _evict(self):
+        if len(self._entries) <= self.max_documents:
+            return
+        clean = sorted((e.used, name) for name, e in self._entries.items() if not e.dirty)
+        for _, name in clean[:len(self._entries) - self.max_documents]:
+            del self._entries[name]
+            self.stats['evictions'] += 1
+
+    # ---------- Фоновая выгрузка ----------
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='document-flush', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self.flush_interval > 0:
+                self._stop.wait(self.flush_interval)
+            else:
+                # Режим «писать сразу»: просыпаемся на каждый put()
+                self._wake.wait()
+                self._wake.clear()
+            self.flush()
+
+    def close(self):
+        # Гарантированная выгрузка при остановке бота
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
@@ -0,0 +1,203 @@
+import csv
+import io
+from bisect import bisect_right
+from operations import record
+
+# ---------- Разбор команд ----------
+# Одна строка — одна команда. Тот же разбор используется для обычного
+# сообщения, для пакета строк и для строк CSV-файла.
+
+EXPENSE_USAGE = '❌ Ошибка формата. Используй: расход <сумма> <название> [аванс/зарплата]'
+INCOME_USAGE = '❌ Ошибка формата. Используй: доход <сумма> <название>'
+DELETE_USAGE = '❌ Укажи название: удали <название>'
+COMMAND_PREFIXES = ('новый месяц', 'расход', 'доход', 'удали', 'отчёт')
+# Больше ошибок в сводку пакета не влезет в одно сообщение
+MAX_REPORTED_ERRORS = 30
+# Сумма одной операции по модулю. Индекс аналитики хранит суммы в int64 —
+# с таким пределом до переполнения не дойдут и итоги за месяц и по счетам
+MAX_AMOUNT = 10 ** 15
+
+# ---------- Смайлики ----------
+# Диапазоны пиктограмм (Extended_Pictographic из Unicode, с запасом),
+# по возрастанию — ищем через bisect
+EMOJI_RANGES = (
+    (0x00A9, 0x00A9), (0x00AE, 0x00AE), (0x203C, 0x203C), (0x2049, 0x2049),
+    (0x2122, 0x2122), (0x2139, 0x2139), (0x2194, 0x21AA), (0x231A, 0x23FF),
+    (0x24C2, 0x24C2), (0x25AA, 0x25FE), (0x2600, 0x27BF), (0x2934, 0x2935),
+    (0x2B05, 0x2B55), (0x3030, 0x3030), (0x303D, 0x303D), (0x3297, 0x3299),
+    (0x1F000, 0x1F1E5), (0x1F200, 0x1FAFF), (0x1FC00, 0x1FFFD),
+)
+EMOJI_STARTS = [start for start, _ in EMOJI_RANGES]
+REGIONAL_INDICATORS = range(0x1F1E6, 0x1F200)   # буквы флагов, идут парами
+KEYCAP_BASES = '0123456789#*'
+ZWJ = '\u200d'
+# Продолжают смайлик: вариации, оттенки кожи, колпачок клавиши, теги флагов
+EMOJI_MODIFIERS = {'\ufe0e', '\ufe0f', '\u20e3', *map(chr, range(0x1F3FB, 0x1F400)),
+                   *map(chr, range(0xE0020, 0xE0080))}
+
+
+class CommandError(ValueError):
+    pass
+
+
+def is_command(line):
+    return line.lower().startswith(COMMAND_PREFIXES)
+
+
+def parse_amount(text, usage):
+    try:
+        amount = int(text)
+    except ValueError:
+        raise CommandError(usage)
+    if abs(amount) > MAX_AMOUNT:
+        raise CommandError(usage)
+    return amount
+
+
+def parse_command(line):
+    # Возвращает dict команды, None — если это не команда
+    text = line.strip()
+    ltext = text.lower()
+    parts = text.split()
+    if ltext.startswith('новый месяц'):
+        return {'cmd': 'new_month'}
+    if ltext.startswith('расход'):
+        if len(parts) < 3:
+            raise CommandError(EXPENSE_USAGE)
+        amount = parse_amount(parts[1], EXPENSE_USAGE)
+        name = parts[2]
+        account = ' '.join(parts[3:]) if len(parts) > 3 else ''
+        return {'cmd': 'expense', 'amount': amount, 'name': name, 'account': account}
+    if ltext.startswith('доход'):
+        if len(parts) < 2:
+            raise CommandError(INCOME_USAGE)
+        amount = parse_amount(parts[1], INCOME_USAGE)
+        return {'cmd': 'income', 'amount': amount, 'name': ' '.join(parts[2:])}
+    if ltext == 'отчёт':
+        return {'cmd': 'report'}
+    if ltext.startswith('удали'):
+        if len(parts) < 2:
+            raise CommandError(DELETE_USAGE)
+        return {'cmd': 'delete', 'name': parts[1]}
+    return None
+
+
+def is_pictograph(ch):
+    code = ord(ch)
+    idx = bisect_right(EMOJI_STARTS, code) - 1
+    return idx >= 0 and code <= EMOJI_RANGES[idx][1]
+
+
+def split_emojis(token):
+    # Делит слово на смайлики целиком: флаг, 👍🏽, 👨‍👩‍👧, 1️⃣ — один смайлик.
+    # None — если в слове есть что-то кроме смайликов.
+    emojis = []
+    idx = 0
+    while idx < len(token):
+        ch = token[idx]
+        if ord(ch) in REGIONAL_INDICATORS:
+            # Флаг — ровно две буквы подряд
+            if idx + 1 >= len(token) or ord(token[idx + 1]) not in REGIONAL_INDICATORS:
+                return None
+            end = idx + 2
+        elif is_pictograph(ch) or (ch in KEYCAP_BASES and '\u20e3' in token[idx + 1:idx + 3]):
+            end = idx + 1
+            while end < len(token):
+                if token[end] in EMOJI_MODIFIERS:
+                    end += 1
+                elif token[end] == ZWJ and end + 1 < len(token) and is_pictograph(token[end + 1]):
+                    end += 2
+                else:
+                    break
+        else:
+            return None
+        emojis.append(token[idx:end])
+        idx = end
+    return emojis
+
+
+def parse_emojis(text, count):
+    # Смайлики через пробел; слитные («🍔🚕») тоже делятся, но только по
+    # границам смайликов — флаги и оттенки кожи не разваливаются
+    emojis = []
+    for token in text.split():
+        parts = split_emojis(token)
+        if parts is None:
+            raise CommandError(f'❌ «{token}» — не смайлик')
+        emojis.extend(parts)
+    return emojis[:count]
+
+
+def csv_lines(payload: bytes):
+    # Каждая строка CSV — команда: «расход;500;еда;аванс» или «доход,1000,зарплата»
+    text = payload.decode('utf-8-sig')
+    # Разделитель — тот, что чаще встречается в первой строке
+    first_line = text.split('\n', 1)[0]
+    delimiter = max((',', ';', '\t'), key=first_line.count)
+    lines = []
+    for row in csv.reader(io.StringIO(text), delimiter=delimiter):
+        cells = [cell.strip() for cell in row if cell.strip()]
+        if cells:
+            lines.append(' '.join(cells))
+    return lines
+
+
+# ---------- Применение команд к документу ----------
+def execute(data, ops, command):
+    # Применяет команду (кроме «новый месяц» и «отчёт») и возвращает ответ
+    name = command.get('name')
+    amount = command.get('amount')
+    if command['cmd'] == 'expense':
+        if name in data.expenses:
+            record(data, ops, {'op': 'expense', 'name': name, 'amount': amount})
+            return f'Обновлён расход "{name}" (+{amount} ₽)'
+        # Новый расход — ждём смайлик
+        record(data, ops, {'op': 'await_emoji', 'name': name, 'amount': amount, 'account': command['account']})
+        return f'Введите смайлик для нового расхода "{name}"'
+    if command['cmd'] == 'income':
+        updated = name in data.income
+        record(data, ops, {'op': 'income', 'name': name, 'amount': amount})
+        if updated:
+            return f'Обновлён доход "{name}" (+{amount} ₽)'
+        return f'Добавлен новый доход "{name}"'
+    if command['cmd'] == 'delete':
+        if name in data.expenses:
+            record(data, ops, {'op': 'delete', 'name': name})
+            return f'Удалён расход "{name}"'
+        return f'Расход "{name}" не найден'
+    raise CommandError(f'❌ Команду «{command["cmd"]}» нельзя выполнить здесь')
+
+
+def emoji_prompt(data):
+    names = [pending['name'] for pending in data.awaiting_emoji]
+    if len(names) == 1:
+        return f'Введите смайлик для нового расхода "{names[0]}"'
+    quoted = ', '.join(f'"{name}"' for name in names)
+    return f'Введите смайлики для новых расходов по порядку, через пробел: {quoted}'
+
+
+def run_batch(data, ops, lines):
+    # Все строки — одна транзакция над одним документом; ошибки не мешают остальным
+    applied = 0
+    errors = []
+    for number, line in enumerate(lines, 1):
+        try:
+            command = parse_command(line)
+            if command is None:
+                raise CommandError(f'❓ Непонятная строка: {line}')
+            if command['cmd'] == 'new_month':
+                raise CommandError('❌ «новый месяц» — только отдельным сообщением')
+            if command['cmd'] != 'report':
+                execute(data, ops, command)
+        except CommandError as e:
+            errors.append(f'{number}. {e}')
+            continue
+        applied += 1
+    summary = f'📥 Обработано строк: {applied} из {len(lines)}'
+    if errors:
+        summary += '\n\nОшибки:\n' + '\n'.join(errors[:MAX_REPORTED_ERRORS])
+        if len(errors) > MAX_REPORTED_ERRORS:
+            summary += f'\n… и ещё {len(errors) - MAX_REPORTED_ERRORS}'
+    if data.awaiting_emoji:
+        summary += '\n\n' + emoji_prompt(data)
+    return summary
@@ -0,0 +1,67 @@
+import os
+from dotenv import load_dotenv
+
+# ---------- Загружаем переменные из .env ----------
+load_dotenv()
+BOT_TOKEN = os.getenv("BOT_TOKEN")
+# Адрес Bot API (свой сервер Bot API или заглушка для нагрузочных тестов)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org/bot")
+YANDEX_TOKEN = os.getenv("YANDEX_TOKEN")
+YANDEX_DIR = os.getenv("YANDEX_DIR")
+YANDEX_API_URL = os.getenv("YANDEX_API_URL", "https://cloud-api.yandex.net/v1/disk")
+
+# ---------- Кэш документов ----------
+# Интервал фоновой выгрузки изменений на Яндекс.Диск (0 — писать сразу)
+CACHE_FLUSH_INTERVAL = float(os.getenv("CACHE_FLUSH_INTERVAL", "5"))
+# Сколько секунд документ из кэша считается свежим без сверки с Диском
+CACHE_TTL = float(os.getenv("CACHE_TTL", "30"))
+# Сколько месяцев держать в памяти одновременно
+CACHE_MAX_DOCUMENTS = int(os.getenv("CACHE_MAX_DOCUMENTS", "3"))
+
+# ---------- Хранилище ----------
+# yandex — документ целиком на Диске; log — локальный журнал операций,
+# снимки которого копируются на Диск
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "yandex")
+STORAGE_DIR = os.getenv("STORAGE_DIR", "data")
+# После скольких записей журнал сворачивается в снимок
+LOG_COMPACT_EVERY = int(os.getenv("LOG_COMPACT_EVERY", "200"))
+
+# ---------- Пул обработчиков ----------
+# Сколько чатов обрабатывается параллельно
+WORKER_POOL_SIZE = int(os.getenv("WORKER_POOL_SIZE", "8"))
+# Сколько апдейтов может ждать в очереди одного потока (очередь Dispatcher не ограничена)
+WORKER_QUEUE_DEPTH = int(os.getenv("WORKER_QUEUE_DEPTH", "100"))
+
+# ---------- Режим работы ----------
+# polling — long polling (запасной вариант), webhook — Flask-приложение
+# (python bot.py — отладочный сервер, в проде — WSGI-сервер через wsgi.py).
+# В обоих режимах бот работает строго одним процессом, см. webhook.py
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# Публичный адрес, на который Telegram шлёт апдейты (без /webhook)
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("PORT", "8080"))
+
+# ---------- Публикация отчёта ----------
+# Правки отчёта, пришедшие за это время, склеиваются в одну
+REPORT_COALESCE_WINDOW = float(os.getenv("REPORT_COALESCE_WINDOW", "1"))
+# Запросов в секунду к одному чату и размер всплеска
+REPORT_CHAT_RATE = float(os.getenv("REPORT_CHAT_RATE", "1"))
+REPORT_CHAT_BURST = int(os.getenv("REPORT_CHAT_BURST", "3"))
+# Общий предел запросов бота в секунду
+REPORT_GLOBAL_RATE = float(os.getenv("REPORT_GLOBAL_RATE", "30"))
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "4"))
+
+# ---------- Аналитика ----------
+# Сколько месяцев качать параллельно при сборке сводного индекса
+ROLLUP_FETCH_WORKERS = int(os.getenv("ROLLUP_FETCH_WORKERS", "4"))
+# Через сколько секунд снова проверять месяц, которого не нашлось в хранилище
+ROLLUP_MISSING_TTL = float(os.getenv("ROLLUP_MISSING_TTL", "600"))
+
+# ---------- Метрики ----------
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+# В режиме polling /metrics отдаёт отдельный HTTP-сервер (0 — не запускать)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+# Раз в сколько секунд писать сводку метрик в лог (0 — не писать)
+METRICS_LOG_INTERVAL = float(os.getenv("METRICS_LOG_INTERVAL", "0"))
@@ -0,0 +1,191 @@
+import json
+import time
+import logging
+import threading
+from bisect import bisect_right
+from collections import deque
+from time import perf_counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import METRICS_ENABLED
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограммы, секунды
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PREFIX = 'budgetbot'
+# Сколько замеров копить до раскладки по корзинам
+FOLD_EVERY = 1024
+
+
+class Histogram:
+    # Замер только кладётся в deque (append атомарен под GIL), в корзины замеры
+    # раскладываются пачками — при чтении или когда их накопилось FOLD_EVERY.
+    # Так горячий путь обходится без замка и bisect.
+    __slots__ = ('counts', 'total', 'count', 'lock', 'pending')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+        self.pending = deque()
+
+    def fold(self):
+        with self.lock:
+            pending, counts = self.pending, self.counts
+            # Забираем ровно столько, сколько лежит сейчас: новые замеры
+            # дописываются справа и дождутся следующей пачки
+            popleft = pending.popleft
+            batch = [popleft() for _ in range(len(pending))]
+            if batch:
+                # Отсортированную пачку раскладываем по границам корзин —
+                # bisect на корзину, а не на каждый замер
+                batch.sort()
+                below = 0
+                for i, bound in enumerate(BUCKETS):
+                    upto = bisect_right(batch, bound, below)
+                    counts[i] += upto - below
+                    below = upto
+                counts[-1] += len(batch) - below
+                self.total += sum(batch)
+                self.count += len(batch)
+            return list(counts), self.total, self.count
+
+    def quantile(self, q):
+        # Оценка по корзинам: верхняя граница корзины, где набралась доля q
+        counts, _, count = self.fold()
+        if not count:
+            return 0.0
+        seen = 0
+        for bound, bucket in zip(BUCKETS + (float('inf'),), counts):
+            seen += bucket
+            if seen >= q * count:
+                return bound
+        return float('inf')
+
+
+class _Timer:
+    __slots__ = ('histogram', 'started')
+
+    def __enter__(self):
+        self.started = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        histogram = self.histogram
+        pending = histogram.pending
+        pending.append(perf_counter() - self.started)
+        if len(pending) >= FOLD_EVERY:
+            histogram.fold()
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+# ---------- Метрики бота ----------
+# timer(stage) замеряет этап обработки апдейта, error(kind) считает ошибки.
+# Выключенные метрики отдают один и тот же пустой контекст — почти бесплатно.
+class Metrics:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._histograms = {}
+        self._errors = {}
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    def timer(self, stage):
+        if not self.enabled:
+            return NULL_TIMER
+        try:
+            histogram = self._histograms[stage]
+        except KeyError:
+            with self._lock:
+                histogram = self._histograms.setdefault(stage, Histogram())
+        timer = _Timer()
+        timer.histogram = histogram
+        return timer
+
+    def error(self, kind):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._errors[kind] = self._errors.get(kind, 0) + 1
+
+    def add_collector(self, name, collect):
+        # collect() -> dict числовых показателей (stats кэша, публикатора и т.п.)
+        self._collectors[name] = collect
+
+    # ---------- Экспорт ----------
+    def render(self):
+        lines = [f'# TYPE {PREFIX}_stage_seconds histogram']
+        for stage, hist in sorted(self._histograms.items()):
+            counts, total, count = hist.fold()
+            seen = 0
+            for bound, bucket in zip(BUCKETS, counts):
+                seen += bucket
+                lines.append(f'{PREFIX}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {seen}')
+            lines.append(f'{PREFIX}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'{PREFIX}_stage_seconds_sum{{stage="{stage}"}} {total}')
+            lines.append(f'{PREFIX}_stage_seconds_count{{stage="{stage}"}} {count}')
+        lines.append(f'# TYPE {PREFIX}_errors_total counter')
+        with self._lock:
+            errors = dict(self._errors)
+        for kind, value in sorted(errors.items()):
+            lines.append(f'{PREFIX}_errors_total{{kind="{kind}"}} {value}')
+        for name, collect in sorted(self._collectors.items()):
+            for key, value in sorted(collect().items()):
+                lines.append(f'{PREFIX}_{name}_{key} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        stages = {}
+        for stage, hist in sorted(self._histograms.items()):
+            p50 = hist.quantile(0.5)
+            stages[stage] = {'count': hist.count, 'p50': p50, 'p99': hist.quantile(0.99)}
+        with self._lock:
+            errors = dict(self._errors)
+        return {'stages': stages, 'errors': errors}
+
+    def start_logging(self, interval):
+        # Периодическая строка в лог в виде JSON — удобно грепать и парсить
+        def run():
+            while True:
+                time.sleep(interval)
+                logger.info('metrics %s', json.dumps(self.snapshot(), ensure_ascii=False))
+        threading.Thread(target=run, name='metrics-log', daemon=True).start()
+
+    def serve(self, host, port):
+        # Отдельный HTTP-сервер /metrics для режима polling
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+        return server
+
+
+metrics = Metrics(enabled=METRICS_ENABLED)
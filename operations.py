@@ -0,0 +1,55 @@
+import logging
+from budget import Budget
+
+logger = logging.getLogger(__name__)
+
+# ---------- Операции над документом бюджета ----------
+# Каждая команда бота сводится к одной или нескольким компактным записям
+# вида {'op': ..., ...}. Одни и те же записи применяются к документу в памяти
+# и проигрываются при старте из журнала (см. storage.LogStorage).
+
+
+def apply_operation(budget, op):
+    kind = op['op']
+    if kind == 'new_month':
+        return Budget(op['month'], op['year'])
+    if budget is None:
+        raise ValueError(f'Операция {kind} до начала месяца')
+
+    if kind == 'expense':
+        budget.add_expense(op['name'], op['amount'])
+    elif kind == 'await_emoji':
+        budget.await_emoji(op['name'], op['amount'], op['account'])
+    elif kind == 'emoji':
+        if not budget.awaiting_emoji:
+            raise ValueError(f'Смайлик для "{op.get("name")}", но никто не ждёт')
+        budget.assign_emoji(op['emoji'])
+    elif kind == 'income':
+        budget.add_income(op['name'], op['amount'])
+    elif kind == 'delete':
+        budget.delete_expense(op['name'])
+    elif kind == 'message':
+        budget.last_message_id = op['message_id']
+    elif kind == 'report':
+        budget.set_report_messages(op['chat_id'], op['message_ids'])
+    else:
+        raise ValueError(f'Неизвестная операция: {kind}')
+    return budget
+
+
+def record(budget, ops, op):
+    # Применяем операцию и запоминаем её для журнала
+    ops.append(op)
+    return apply_operation(budget, op)
+
+
+def replay(data, ops):
+    # Проигрываем журнал поверх снимка в JSON-формате, результат — тоже JSON
+    budget = None if data is None else Budget.from_dict(data)
+    for op in ops:
+        try:
+            budget = apply_operation(budget, op)
+        except (ValueError, KeyError) as e:
+            # Несогласованная запись не должна навсегда закрыть месяц
+            logger.warning('Пропущена запись журнала %s: %s', op.get('seq'), e)
+    return None if budget is None else budget.to_dict()
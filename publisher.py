@@ -0,0 +1,254 @@
+import time
+import heapq
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from telegram.error import RetryAfter, BadRequest, NetworkError
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Предел длины одного сообщения в Telegram
+MESSAGE_LIMIT = 4096
+
+
+# ---------- Ограничение частоты запросов ----------
+# Классический token bucket с резервированием: acquire() сразу забирает
+# токен и возвращает, сколько подождать до его появления.
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'stamp', 'lock')
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def penalize(self, seconds):
+        # Telegram попросил подождать — откладываем все следующие запросы
+        with self.lock:
+            self.tokens = min(self.tokens, -seconds * self.rate)
+            self.stamp = time.monotonic()
+
+
+def split_report(text, limit=MESSAGE_LIMIT):
+    # Режем по строкам, чтобы статья не разваливалась между сообщениями
+    parts, current = [], ''
+    for line in text.splitlines(True):
+        while len(line) > limit:
+            if current:
+                parts.append(current)
+                current = ''
+            parts.append(line[:limit])
+            line = line[limit:]
+        if len(current) + len(line) > limit:
+            parts.append(current)
+            current = ''
+        current += line
+    if current or not parts:
+        parts.append(current)
+    return parts
+
+
+class _ChatReport:
+    __slots__ = ('key', 'message_ids', 'texts', 'pending', 'due', 'busy', 'failures')
+
+    def __init__(self, key, message_ids):
+        self.key = key                     # документ, к которому относится отчёт
+        self.message_ids = list(message_ids or [])
+        self.texts = [None] * len(self.message_ids)  # что сейчас показано
+        self.pending = None
+        self.due = None
+        self.busy = False
+        self.failures = 0                  # неудачных отправок подряд
+
+
+# ---------- Публикация отчёта ----------
+# Отчёт в чате — группа сообщений, которую мы правим на месте через
+# edit_message_text. Обновления, пришедшие в пределах window секунд,
+# склеиваются в одну правку; неизменившиеся части не отправляются вовсе.
+# Каждый запрос проходит через token bucket чата и общий bucket бота.
+# on_messages(chat_id, key, message_ids) вызывается, когда состав группы
+# поменялся, чтобы сохранить его в документе. Сетевой сбой (таймаут, обрыв)
+# не теряет отчёт: текст возвращается в pending и отправляется снова через
+# retry_delay, 2 * retry_delay, ... но не реже раза в retry_max секунд.
+class ReportPublisher:
+    def __init__(self, on_messages, window=1.0, chat_rate=1.0, chat_burst=3,
+                 global_rate=30.0, workers=4, retry_delay=1.0, retry_max=60.0):
+        self.bot = None
+        self.on_messages = on_messages
+        self.window = window
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.retry_delay = retry_delay
+        self.retry_max = retry_max
+        self._global = TokenBucket(global_rate, global_rate)
+        self._buckets = {}
+        self._chats = {}
+        self._heap = []
+        self._cond = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='report')
+        self._closed = False
+        self._thread = None
+        self.stats = {'published': 0, 'coalesced': 0, 'edits': 0, 'sends': 0,
+                      'deletes': 0, 'skipped': 0, 'retry_after': 0, 'errors': 0, 'retries': 0}
+
+    def start(self, bot):
+        self.bot = bot
+        self._thread = threading.Thread(target=self._run, name='report-scheduler', daemon=True)
+        self._thread.start()
+
+    def publish(self, chat_id, key, text, message_ids=None):
+        with self._cond:
+            state = self._chats.get(chat_id)
+            if state is None or state.key != key:
+                # Новый документ (например, новый месяц) — новая группа сообщений
+                state = self._chats[chat_id] = _ChatReport(key, message_ids)
+            self.stats['published'] += 1
+            if state.pending is not None:
+                self.stats['coalesced'] += 1
+            state.pending = text
+            if state.due is None and not state.busy:
+                state.due = time.monotonic() + self.window
+                heapq.heappush(self._heap, (state.due, chat_id))
+                self._cond.notify()
+
+    # ---------- Планировщик ----------
+    def _run(self):
+        with self._cond:
+            while True:
+                if self._closed and not self._heap and not any(s.busy for s in self._chats.values()):
+                    return
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                due, chat_id = self._heap[0]
+                delay = due - time.monotonic()
+                if delay > 0 and not self._closed:
+                    self._cond.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+                state = self._chats.get(chat_id)
+                if state is None or state.due != due:
+                    continue
+                state.due = None
+                state.busy = True
+                self._pool.submit(self._send, chat_id, state)
+
+    def _send(self, chat_id, state):
+        with self._cond:
+            text, state.pending = state.pending, None
+        retry = False
+        message_ids = list(state.message_ids)
+        try:
+            changed = self._sync(chat_id, state, split_report(text))
+            state.failures = 0
+        except Exception as e:
+            logger.exception('Не удалось обновить отчёт в чате %s', chat_id)
+            self.stats['errors'] += 1
+            metrics.error('telegram')
+            # Сетевой сбой проходит сам — пробуем ещё раз; BadRequest и прочее — нет
+            retry = isinstance(e, NetworkError) and not isinstance(e, BadRequest)
+            # До сбоя могли успеть отправить новые сообщения — их надо сохранить
+            changed = state.message_ids != message_ids
+        if changed:
+            try:
+                self.on_messages(chat_id, state.key, list(state.message_ids))
+            except Exception:
+                logger.exception('Не удалось сохранить сообщения отчёта чата %s', chat_id)
+        with self._cond:
+            state.busy = False
+            delay = self.window
+            if retry and not self._closed:
+                # Новее нашего текста может быть только то, что пришло за время отправки
+                if state.pending is None:
+                    state.pending = text
+                state.failures += 1
+                delay = min(self.retry_max, self.retry_delay * 2 ** (state.failures - 1))
+                self.stats['retries'] += 1
+            # Пока отправляли, пришли новые правки — планируем следующую
+            if state.pending is not None and self._chats.get(chat_id) is state:
+                state.due = time.monotonic() + (0 if self._closed else delay)
+                heapq.heappush(self._heap, (state.due, chat_id))
+            self._cond.notify()
+
+    def _sync(self, chat_id, state, parts):
+        changed = False
+        for idx, part in enumerate(parts):
+            if idx < len(state.message_ids):
+                if state.texts[idx] == part:
+                    self.stats['skipped'] += 1
+                    continue
+                if self._edit(chat_id, state.message_ids[idx], part):
+                    state.texts[idx] = part
+                    continue
+                # Старое сообщение удалено или слишком старое — шлём новое
+                msg = self._call(chat_id, self.bot.send_message, chat_id=chat_id, text=part)
+                self.stats['sends'] += 1
+                state.message_ids[idx] = msg.message_id
+                state.texts[idx] = part
+            else:
+                msg = self._call(chat_id, self.bot.send_message, chat_id=chat_id, text=part)
+                self.stats['sends'] += 1
+                state.message_ids.append(msg.message_id)
+                state.texts.append(part)
+            changed = True
+        # Отчёт стал короче — лишние сообщения удаляем
+        while len(state.message_ids) > len(parts):
+            message_id = state.message_ids.pop()
+            state.texts.pop()
+            try:
+                self._call(chat_id, self.bot.delete_message, chat_id=chat_id, message_id=message_id)
+                self.stats['deletes'] += 1
+            except BadRequest:
+                pass
+            changed = True
+        return changed
+
+    def _edit(self, chat_id, message_id, text):
+        try:
+            self._call(chat_id, self.bot.edit_message_text, chat_id=chat_id, message_id=message_id, text=text)
+            self.stats['edits'] += 1
+            return True
+        except BadRequest as e:
+            if 'not modified' in str(e).lower():
+                return True
+            return False
+
+    def _call(self, bucket_key, method, **kwargs):
+        bucket = self._buckets.get(bucket_key)
+        if bucket is None:
+            bucket = self._buckets.setdefault(bucket_key, TokenBucket(self.chat_rate, self.chat_burst))
+        while True:
+            delay = max(bucket.acquire(), self._global.acquire())
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                with metrics.timer(f'telegram_{method.__name__}'):
+                    return method(**kwargs)
+            except RetryAfter as e:
+                self.stats['retry_after'] += 1
+                metrics.error('telegram_retry_after')
+                bucket.penalize(e.retry_after)
+
+    def close(self):
+        # Отправляем всё, что ещё ждёт окна склейки, и дожидаемся отправки
+        with self._cond:
+            self._closed = True
+            for chat_id, state in self._chats.items():
+                if state.due is not None:
+                    state.due = 0.0
+                    heapq.heappush(self._heap, (0.0, chat_id))
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self._pool.shutdown(wait=True)
@@ -0,0 +1,253 @@
+import os
+import json
+import time
+import logging
+import threading
+from yandex_disk import fetch_from_yandex, upload_payload, stat_yandex
+from operations import replay
+
+logger = logging.getLogger(__name__)
+
+
+# ---------- Хранилища документов ----------
+# Общий интерфейс для DocumentCache:
+#   fetch(name) -> (data, etag), FileNotFoundError если документа нет
+#   save(name, payload, ops) -> etag; ops=None — документ записан целиком
+#   stat(name) -> etag или None
+#   collect() -> dict числовых показателей для /metrics
+#   close()
+
+
+# ---------- Яндекс.Диск: весь документ одним файлом ----------
+class YandexStorage:
+    def __init__(self):
+        self.stats = {'bytes_uploaded': 0, 'uploads': 0}
+
+    def fetch(self, name):
+        return fetch_from_yandex(name)
+
+    def save(self, name, payload, ops=None):
+        etag = upload_payload(name, payload)
+        self.stats['uploads'] += 1
+        self.stats['bytes_uploaded'] += len(payload)
+        return etag
+
+    def stat(self, name):
+        return stat_yandex(name)
+
+    def collect(self):
+        return dict(self.stats)
+
+    def close(self):
+        pass
+
+
+# ---------- Локальный журнал операций со снимками ----------
+# <dir>/<name>.log      — по записи JSON на строку: {"seq": N, "op": ...}
+# <dir>/<name>.snapshot — {"seq": N, "data": {...}}, всё до N уже в снимке
+# Раз в compact_every записей журнал сворачивается в снимок, а снимок
+# копируется на Яндекс.Диск (mirror) как резервная копия в прежнем формате.
+# Копирует отдельный поток, вне замка: запись в журнал не ждёт HTTP. Пока
+# копия не ушла, новый снимок того же документа просто её заменяет.
+class LogStorage:
+    def __init__(self, directory, mirror=None, compact_every=200):
+        self.directory = directory
+        self.mirror = mirror
+        self.compact_every = compact_every
+        self._seq = {}        # name -> номер последней записи
+        self._pending = {}    # name -> записей с последнего снимка
+        self._payload = {}    # name -> последнее известное состояние (bytes)
+        self._lock = threading.Lock()
+        self._uploads = {}    # name -> снимок, ждущий копирования на Диск
+        self._uploads_ready = threading.Condition()
+        self._uploader = None
+        self._closing = False
+        self.stats = {
+            'replays': 0, 'replay_seconds': 0.0, 'replayed_records': 0,
+            'op_bytes': 0,           # сами операции, без seq и без записей целиком
+            'log_bytes': 0,          # записано в журнал
+            'snapshot_bytes': 0,     # записано в снимки
+            'full_rewrite_bytes': 0, # столько ушло бы при перезаписи целиком
+            'compactions': 0, 'bytes_uploaded': 0, 'mirror_errors': 0,
+        }
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name, suffix):
+        return os.path.join(self.directory, f'{name}.{suffix}')
+
+    def write_amplification(self):
+        if not self.stats['op_bytes']:
+            return 0.0
+        written = self.stats['log_bytes'] + self.stats['snapshot_bytes']
+        return written / self.stats['op_bytes']
+
+    def collect(self):
+        stats = dict(self.stats)
+        stats['write_amplification'] = self.write_amplification()
+        # Каждое чтение документа с диска — одно проигрывание снимка и журнала
+        stats['replay_seconds_avg'] = stats['replay_seconds'] / stats['replays'] if stats['replays'] else 0.0
+        return stats
+
+    # ---------- Чтение: снимок + проигрывание журнала ----------
+    def fetch(self, name):
+        with self._lock:
+            data, seq = self._replay(name)
+            if data is None:
+                raise FileNotFoundError(name)
+            return data, str(seq)
+
+    def _replay(self, name):
+        started = time.perf_counter()
+        data, seq = self._read_snapshot(name)
+        records = []
+        replayed = 0
+        log_path = self._path(name, 'log')
+        if os.path.exists(log_path):
+            with open(log_path, 'rb+') as f:
+                good = 0    # конец последней целой записи
+                for line in f:
+                    try:
+                        if not line.endswith(b'\n'):
+                            raise ValueError('нет конца строки')
+                        rec = json.loads(line)
+                    except ValueError:
+                        # Оборванный хвост после сбоя: обрезаем, иначе новые
+                        # записи лягут за мусором и при следующем чтении пропадут
+                        logger.warning('Обрезан повреждённый хвост %s с позиции %d', log_path, good)
+                        f.truncate(good)
+                        f.flush()
+                        os.fsync(f.fileno())
+                        break
+                    good += len(line)
+                    if rec['seq'] <= seq:
+                        continue
+                    if rec['op'] == 'put':
+                        # Документ записан целиком — всё, что было до, не нужно
+                        data, records = rec['data'], []
+                    else:
+                        records.append(rec)
+                    seq = rec['seq']
+                    replayed += 1
+        if records:
+            data = replay(data, records)
+        self.stats['replays'] += 1
+        self.stats['replay_seconds'] += time.perf_counter() - started
+        self.stats['replayed_records'] += replayed
+        self._seq[name] = seq
+        self._pending[name] = replayed
+        return data, seq
+
+    def _read_snapshot(self, name):
+        path = self._path(name, 'snapshot')
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                snapshot = json.load(f)
+            return snapshot['data'], snapshot['seq']
+        if self.mirror is not None and not os.path.exists(self._path(name, 'log')):
+            # Локально пусто — восстанавливаемся из резервной копии
+            try:
+                data, _ = self.mirror.fetch(name)
+            except FileNotFoundError:
+                return None, 0
+            self._write_snapshot(name, 0, json.dumps(data, ensure_ascii=False).encode('utf-8'))
+            return data, 0
+        return None, 0
+
+    # ---------- Запись: дописываем операции в конец журнала ----------
+    def save(self, name, payload, ops=None):
+        with self._lock:
+            if name not in self._seq:
+                # Пишем в документ, который ещё не читали: продолжаем его нумерацию
+                self._replay(name)
+            seq = self._seq[name]
+            if ops is None:
+                ops = [None]
+            lines = []
+            op_bytes = 0
+            for op in ops:
+                seq += 1
+                if op is None:
+                    line = b'{"seq": %d, "op": "put", "data": %s}\n' % (seq, payload)
+                else:
+                    encoded = json.dumps(op, ensure_ascii=False).encode('utf-8')
+                    op_bytes += len(encoded)
+                    # Операция — непустой словарь: дописываем seq в начало
+                    line = b'{"seq": %d, %s\n' % (seq, encoded[1:])
+                lines.append(line)
+            chunk = b''.join(lines)
+            with open(self._path(name, 'log'), 'ab') as f:
+                f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            self._seq[name] = seq
+            self._pending[name] = self._pending.get(name, 0) + len(lines)
+            self._payload[name] = payload
+            self.stats['op_bytes'] += op_bytes
+            self.stats['log_bytes'] += len(chunk)
+            self.stats['full_rewrite_bytes'] += len(payload)
+            if self._pending[name] >= self.compact_every:
+                self._compact(name)
+            return str(seq)
+
+    def stat(self, name):
+        with self._lock:
+            seq = self._seq.get(name)
+        return None if seq is None else str(seq)
+
+    # ---------- Сворачивание журнала в снимок ----------
+    def _compact(self, name):
+        payload = self._payload.get(name)
+        if payload is None:
+            return
+        self._write_snapshot(name, self._seq[name], payload)
+        # Если упадём до обрезки журнала — записи с seq <= N просто пропустятся
+        open(self._path(name, 'log'), 'wb').close()
+        self._pending[name] = 0
+        self.stats['compactions'] += 1
+        if self.mirror is not None:
+            with self._uploads_ready:
+                self._uploads[name] = payload
+                if self._uploader is None:
+                    self._uploader = threading.Thread(target=self._run_uploads, name='log-mirror', daemon=True)
+                    self._uploader.start()
+                self._uploads_ready.notify()
+
+    # ---------- Копирование снимков на Диск ----------
+    def _run_uploads(self):
+        while True:
+            with self._uploads_ready:
+                while not self._uploads and not self._closing:
+                    self._uploads_ready.wait()
+                if not self._uploads:
+                    return
+                name, payload = self._uploads.popitem()
+            try:
+                self.mirror.save(name, payload)
+                self.stats['bytes_uploaded'] += len(payload)
+            except Exception:
+                logger.exception('Не удалось скопировать снимок %s на Диск', name)
+                self.stats['mirror_errors'] += 1
+
+    def _write_snapshot(self, name, seq, payload):
+        snapshot = b'{"seq": %d, "data": %s}' % (seq, payload)
+        tmp_path = self._path(name, 'snapshot.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(snapshot)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._path(name, 'snapshot'))
+        self.stats['snapshot_bytes'] += len(snapshot)
+
+    def close(self):
+        # При остановке сворачиваем всё несвёрнутое и отправляем копию на Диск
+        with self._lock:
+            for name, pending in self._pending.items():
+                if pending:
+                    self._compact(name)
+        # Дожидаемся, пока все снимки уйдут на Диск
+        with self._uploads_ready:
+            self._closing = True
+            uploader, self._uploader = self._uploader, None
+            self._uploads_ready.notify()
+        if uploader is not None:
+            uploader.join()
@@ -0,0 +1,109 @@
+"""Сводный индекс: сверка месяцев с документами по etag и срок отметки
+«месяца нет».
+
+Индекс и документы лежат в одном LogStorage во временном каталоге, как в
+боте с STORAGE_BACKEND=log; «перезапуск» — новые кэши поверх тех же файлов.
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics import INDEX_NAME, Rollup, RollupIndex  # noqa: E402
+from budget import Budget  # noqa: E402
+from cache import DocumentCache  # noqa: E402
+from operations import record  # noqa: E402
+from storage import LogStorage  # noqa: E402
+from workers import KeyedLocks  # noqa: E402
+from yandex_disk import encode_document  # noqa: E402
+
+MARCH, APRIL = '2026-03', '2026-04'
+
+
+class RollupIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='budget-test-')
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.restart()
+
+    def restart(self, missing_ttl=600.0):
+        # Новый процесс: кэши пустые, файлы те же
+        self.storage = LogStorage(self.directory)
+        locks = KeyedLocks()
+        encode = lambda doc: encode_document(doc.to_dict())  # noqa: E731
+        self.documents = DocumentCache(self.storage, encode, Budget.from_dict, locks,
+                                       flush_interval=60, ttl=0)
+        self.index_cache = DocumentCache(self.storage, encode, Rollup.from_dict, locks,
+                                         flush_interval=60, ttl=0, max_documents=1)
+        self.index = RollupIndex(self.index_cache, self.documents, workers=2, missing_ttl=missing_ttl)
+
+    def spend(self, month, amount, name='еда'):
+        # Правка как в боте: документ, затем индекс
+        filename = f'budget_{month}_2026.json'
+        with self.documents.locks(filename):
+            ops = []
+            try:
+                budget = self.documents.get(filename)
+            except FileNotFoundError:
+                budget = record(None, ops, {'op': 'new_month', 'month': month, 'year': 2026})
+            budget = record(budget, ops, {'op': 'expense', 'name': name, 'amount': amount})
+            self.documents.put(filename, budget, ops)
+            self.index.update(budget, ops)
+
+    def spent(self, key):
+        matrices, _ = self.index.months([key])
+        return sum(matrices['expenses'][1])
+
+    def test_index_ahead_of_document_is_reread(self):
+        self.spend('March', 100)
+        self.documents.flush()
+        self.index_cache.flush()
+        # Правка попала в индекс, а документ выгрузить не успели
+        self.spend('March', 50)
+        self.index_cache.flush()
+        self.restart()
+        self.assertEqual(self.spent(MARCH), 100)
+
+    def test_document_ahead_of_index_is_reread(self):
+        self.spend('March', 100)
+        self.documents.flush()
+        self.index_cache.flush()
+        self.assertEqual(self.spent(MARCH), 100)
+        self.index_cache.flush()
+        # Документ выгружен, индекс — нет
+        self.spend('March', 50, name='такси')
+        self.documents.flush()
+        self.restart()
+        self.assertEqual(self.spent(MARCH), 150)
+
+    def test_matching_etag_skips_the_document(self):
+        self.spend('March', 100)
+        self.documents.flush()
+        self.assertEqual(self.spent(MARCH), 100)
+        self.index_cache.flush()
+        self.restart()
+        self.spent(MARCH)     # первая сверка после запуска читает журнал месяца
+        misses = self.documents.stats['misses']
+        self.assertEqual(self.spent(MARCH), 100)
+        self.assertEqual(self.documents.stats['misses'], misses)
+
+    def test_missing_month_expires(self):
+        self.assertEqual(self.index.months([APRIL])[1], [True])
+        self.storage.save('budget_April_2026.json', encode_document(Budget('April', 2026).to_dict()))
+        self.storage.save('budget_April_2026.json', b'{}',
+                          [{'op': 'expense', 'name': 'еда', 'amount': 70}])
+        self.assertEqual(self.index.months([APRIL])[1], [True])
+
+        self.index_cache.flush()
+        self.restart(missing_ttl=0)
+        matrices, missing = self.index.months([APRIL])
+        self.assertEqual(missing, [False])
+        self.assertEqual(sum(matrices['expenses'][1]), 70)
+        self.assertIn(APRIL, self.index_cache.get(INDEX_NAME).etags)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+"""Кэш документов поверх заглушки Яндекс.Диска из benchmarks/fakes.py:
+сверка по md5 после ttl, одна выгрузка на интервал, повтор после сбоя,
+вытеснение и выгрузка при остановке.
+
+Сеть не нужна: заглушка — HTTP-сервер на 127.0.0.1, вызовы Диска считаются
+по методам (stat, get, put).
+"""
+import os
+import sys
+import json
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import yandex_disk  # noqa: E402
+from cache import DocumentCache  # noqa: E402
+from fakes import FakeYandexDisk  # noqa: E402
+from storage import YandexStorage  # noqa: E402
+from yandex_disk import encode_document  # noqa: E402
+
+DIR = 'test'
+NAME = 'budget_October_2026.json'
+
+
+class FlakyDisk(FakeYandexDisk):
+    fail_puts = 0      # сколько ближайших PUT ответить ошибкой
+
+    def handle(self, verb, path, body):
+        if verb == 'PUT' and self.fail_puts:
+            self.fail_puts -= 1
+            return 500, b'{}'
+        return super().handle(verb, path, body)
+
+
+class RecordingStorage:
+    # Запоминает, какие операции кэш отдал на каждую выгрузку
+    def __init__(self, storage):
+        self.storage = storage
+        self.saves = []
+
+    def save(self, name, payload, ops=None):
+        self.saves.append((name, ops))
+        return self.storage.save(name, payload, ops)
+
+    def __getattr__(self, attr):
+        return getattr(self.storage, attr)
+
+
+class DocumentCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.disk = FlakyDisk().start()
+        self.addCleanup(self.disk.stop)
+        for attr, value in (('YANDEX_API_URL', f'{self.disk.url}/v1/disk'), ('YANDEX_DIR', DIR)):
+            patcher = mock.patch.object(yandex_disk, attr, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.storage = RecordingStorage(YandexStorage())
+
+    def cache(self, **kwargs):
+        kwargs.setdefault('flush_interval', 60)
+        cache = DocumentCache(self.storage, encode_document, **kwargs)
+        self.addCleanup(cache.close)
+        return cache
+
+    def upload(self, name, data):
+        self.disk.put_file(f'{DIR}/{name}', encode_document(data))
+
+    def stored(self, name):
+        return json.loads(self.disk.files[f'{DIR}/{name}'])
+
+    def test_stale_entry_is_revalidated_and_refetched_on_change(self):
+        self.upload(NAME, {'v': 1})
+        cache = self.cache(ttl=60)
+        self.assertEqual(cache.get(NAME), {'v': 1})
+        self.assertEqual(cache.get(NAME), {'v': 1})
+        self.assertEqual((self.disk.calls['get'], self.disk.calls['stat']), (1, 0))
+
+        cache.ttl = 0
+        self.assertEqual(cache.get(NAME), {'v': 1})
+        self.assertEqual((self.disk.calls['get'], self.disk.calls['stat']), (1, 1))
+        self.assertEqual(cache.stats['revalidations'], 1)
+
+        # Документ поменяли мимо бота — md5 не сходится, качаем заново
+        self.upload(NAME, {'v': 2})
+        self.assertEqual(cache.get(NAME), {'v': 2})
+        self.assertEqual((self.disk.calls['get'], self.disk.calls['stat']), (2, 2))
+
+    def test_puts_within_interval_make_one_upload(self):
+        cache = self.cache()
+        for i in range(20):
+            cache.put(NAME, {'v': i}, [{'op': 'set', 'v': i}])
+        self.assertEqual(self.disk.calls['put'], 0)
+        cache.flush()
+        self.assertEqual(self.disk.calls['put'], 1)
+        self.assertEqual(self.stored(NAME), {'v': 19})
+        self.assertEqual(self.storage.saves, [(NAME, [{'op': 'set', 'v': i} for i in range(20)])])
+        cache.flush()
+        self.assertEqual(self.disk.calls['put'], 1)
+
+    def test_failed_flush_keeps_ops_in_order(self):
+        cache = self.cache()
+        cache.put(NAME, {'v': 1}, [{'op': 'set', 'v': 1}])
+        cache.put(NAME, {'v': 2}, [{'op': 'set', 'v': 2}])
+        self.disk.fail_puts = 1
+        with self.assertLogs('cache', 'ERROR'):
+            cache.flush()
+        self.assertEqual(cache.stats['flush_errors'], 1)
+        self.assertNotIn(f'{DIR}/{NAME}', self.disk.files)
+
+        cache.put(NAME, {'v': 3}, [{'op': 'set', 'v': 3}])
+        cache.flush()
+        self.assertEqual(self.stored(NAME), {'v': 3})
+        self.assertEqual(self.storage.saves[-1], (NAME, [{'op': 'set', 'v': v} for v in (1, 2, 3)]))
+        self.assertEqual(cache.stats['flushes'], 1)
+
+    def test_eviction_keeps_dirty_entries(self):
+        cache = self.cache(max_documents=2)
+        cache.put('a.json', {'v': 'a'})
+        cache.put('b.json', {'v': 'b'})
+        self.upload('c.json', {'v': 'c'})
+        self.assertEqual(cache.get('c.json'), {'v': 'c'})
+        # Грязные a и b вытеснять нельзя — уходит чистый c
+        self.assertEqual(cache.stats['evictions'], 1)
+        self.assertEqual(cache.get('a.json'), {'v': 'a'})
+        self.assertEqual(cache.get('b.json'), {'v': 'b'})
+        self.assertEqual(self.disk.calls['get'], 1)
+
+        cache.flush()
+        self.assertEqual(cache.get('c.json'), {'v': 'c'})
+        self.assertEqual(self.disk.calls['get'], 2)
+        # После выгрузки a и b чистые: на c вытеснен давно не читанный a
+        self.assertEqual(cache.stats['evictions'], 2)
+        cache.get('b.json')
+        self.assertEqual(self.disk.calls['get'], 2)
+
+    def test_close_flushes_dirty_entries(self):
+        cache = self.cache()
+        cache.start()
+        cache.put(NAME, {'v': 1}, [{'op': 'set', 'v': 1}])
+        cache.close()
+        self.assertEqual(self.stored(NAME), {'v': 1})
+        self.assertEqual(self.disk.calls['put'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+"""Разбор команд: границы сумм и смайлики в ответ на «введите смайлик»."""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from commands import (CommandError, EXPENSE_USAGE, INCOME_USAGE, MAX_AMOUNT,  # noqa: E402
+                      parse_command, parse_emojis)
+
+
+class ParseAmountTest(unittest.TestCase):
+    def test_amount_within_bounds(self):
+        command = parse_command(f'расход {MAX_AMOUNT} еда аванс')
+        self.assertEqual(command, {'cmd': 'expense', 'amount': MAX_AMOUNT, 'name': 'еда', 'account': 'аванс'})
+        self.assertEqual(parse_command('доход -5 возврат')['amount'], -5)
+
+    def test_amount_out_of_bounds_is_a_usage_error(self):
+        for line, usage in ((f'расход {MAX_AMOUNT + 1} еда', EXPENSE_USAGE),
+                            ('расход 9999999999999999999 еда', EXPENSE_USAGE),
+                            (f'доход -{MAX_AMOUNT + 1} зп', INCOME_USAGE)):
+            with self.assertRaises(CommandError) as ctx:
+                parse_command(line)
+            self.assertEqual(str(ctx.exception), usage)
+
+
+class ParseEmojisTest(unittest.TestCase):
+    def test_whole_emoji_are_kept(self):
+        self.assertEqual(parse_emojis('🇷🇺👍🏽 👨‍👩‍👧 1️⃣', 4), ['🇷🇺', '👍🏽', '👨‍👩‍👧', '1️⃣'])
+        self.assertEqual(parse_emojis('🍔🚕', 1), ['🍔'])
+
+    def test_text_is_rejected(self):
+        for text in ('abc', '🍔 да', '🇷', '1'):
+            with self.assertRaises(CommandError):
+                parse_emojis(text, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
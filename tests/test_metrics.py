@@ -0,0 +1,84 @@
+"""Метрики: замеры доходят до /metrics, а включённые метрики почти ничего
+не стоят обработчику апдейтов.
+
+Цена считается так же, как в benchmarks/bench_metrics.py: шесть пустых
+timer() на апдейт — столько этапов апдейт проходит в потоке обработчика.
+Прогон длиной в несколько FOLD_EVERY апдейтов, так что в каждое время входит
+и раскладка замеров по корзинам. Выключенные и включённые метрики гоняются
+вперемешку, берётся минимум — так паузы планировщика не дают ложных падений.
+"""
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import Histogram, Metrics, NULL_TIMER, BUCKETS, FOLD_EVERY  # noqa: E402
+
+STAGES = ('update', 'load', 'command_parse', 'execute', 'telegram_reply', 'render')
+# Каждый этап успевает сложиться в корзины FOLDS раз за прогон
+FOLDS = 4
+UPDATES = FOLDS * FOLD_EVERY
+REPEATS = 10
+# Сверх пустого with на апдейт, мкс. На медленной виртуалке выходит 5–6:
+# около 4 — сами шесть timer(), до 1 — раскладка по корзинам
+LIMIT_US = 10.0
+
+
+def per_update(registry):
+    timer = registry.timer
+    started = time.perf_counter()
+    for _ in range(UPDATES):
+        for stage in STAGES:
+            with timer(stage):
+                pass
+    return (time.perf_counter() - started) / UPDATES * 1e6
+
+
+class MetricsTest(unittest.TestCase):
+    def test_timer_lands_in_render(self):
+        registry = Metrics(enabled=True)
+        for _ in range(FOLD_EVERY + 1):
+            with registry.timer('load'):
+                pass
+        registry.error('upload')
+        text = registry.render()
+        self.assertIn(f'budgetbot_stage_seconds_count{{stage="load"}} {FOLD_EVERY + 1}', text)
+        self.assertIn('budgetbot_errors_total{kind="upload"} 1', text)
+
+    def test_fold_uses_upper_bounds(self):
+        histogram = Histogram()
+        histogram.pending.extend([BUCKETS[1], BUCKETS[0], BUCKETS[0] * 1.5, 0.0, BUCKETS[-1] * 2])
+        counts, total, count = histogram.fold()
+        self.assertEqual(counts[:2], [2, 2])
+        self.assertEqual(counts[-1], 1)
+        self.assertEqual((count, sum(counts)), (5, 5))
+        self.assertAlmostEqual(total, BUCKETS[1] + BUCKETS[0] * 2.5 + BUCKETS[-1] * 2)
+
+    def test_timer_records_on_exception(self):
+        registry = Metrics(enabled=True)
+        with self.assertRaises(ValueError):
+            with registry.timer('execute'):
+                raise ValueError
+        self.assertEqual(registry.snapshot()['stages']['execute']['count'], 1)
+
+    def test_disabled_metrics_are_a_shared_noop(self):
+        registry = Metrics(enabled=False)
+        self.assertIs(registry.timer('load'), NULL_TIMER)
+        registry.error('upload')
+        self.assertEqual(registry.snapshot(), {'stages': {}, 'errors': {}})
+
+    def test_overhead_per_update(self):
+        disabled, enabled = Metrics(enabled=False), Metrics(enabled=True)
+        disabled_us, enabled_us = [], []
+        for _ in range(REPEATS):
+            disabled_us.append(per_update(disabled))
+            enabled_us.append(per_update(enabled))
+        overhead = min(enabled_us) - min(disabled_us)
+        self.assertLess(overhead, LIMIT_US,
+                        f'метрики стоят {overhead:.2f} мкс на апдейт из {len(STAGES)} этапов')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+"""Локальный журнал операций: восстановление после оборванной записи и
+показатели для /metrics."""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from budget import Budget  # noqa: E402
+from storage import LogStorage  # noqa: E402
+from yandex_disk import encode_document  # noqa: E402
+
+NAME = 'budget_October_2026.json'
+
+
+def income(amount):
+    return {'op': 'income', 'name': 'зп', 'amount': amount}
+
+
+class TornLogTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='budget-test-')
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def restart(self):
+        # Новый процесс: состояние в памяти пропадает, остаются файлы
+        return LogStorage(self.directory, compact_every=1000)
+
+    def income_total(self, storage):
+        data, _ = storage.fetch(NAME)
+        return sum(inc['amount'] for inc in data['income'])
+
+    def test_writes_after_torn_tail_survive_restart(self):
+        storage = self.restart()
+        storage.save(NAME, encode_document(Budget('October', 2026).to_dict()))
+        storage.save(NAME, b'{}', [income(100)])
+        # Процесс упал посреди записи: в журнале половина строки без перевода строки
+        with open(os.path.join(self.directory, f'{NAME}.log'), 'ab') as f:
+            f.write(b'{"seq": 3, "op": "inco')
+
+        storage = self.restart()
+        self.assertEqual(self.income_total(storage), 100)
+        storage.save(NAME, b'{}', [income(50)])
+
+        storage = self.restart()
+        self.assertEqual(self.income_total(storage), 150)
+
+    def test_complete_record_without_newline_is_dropped(self):
+        storage = self.restart()
+        storage.save(NAME, encode_document(Budget('October', 2026).to_dict()))
+        # Запись целиком, но без \n — за ней склеилась бы следующая
+        with open(os.path.join(self.directory, f'{NAME}.log'), 'ab') as f:
+            f.write(b'{"seq": 2, "op": "income", "name": "x", "amount": 1}')
+
+        storage = self.restart()
+        self.assertEqual(self.income_total(storage), 0)
+        storage.save(NAME, b'{}', [income(7)])
+        self.assertEqual(self.income_total(self.restart()), 7)
+
+
+class CollectTest(unittest.TestCase):
+    def test_collect_reports_amplification_and_replay_time(self):
+        directory = tempfile.mkdtemp(prefix='budget-test-')
+        self.addCleanup(shutil.rmtree, directory)
+        storage = LogStorage(directory, compact_every=1000)
+        self.assertEqual(storage.collect()['write_amplification'], 0.0)
+        storage.save(NAME, encode_document(Budget('October', 2026).to_dict()))
+        for amount in range(1, 11):
+            storage.save(NAME, b'{}', [income(amount)])
+
+        storage = LogStorage(directory, compact_every=1000)
+        storage.fetch(NAME)
+        storage.save(NAME, b'{}', [income(11)])
+        stats = storage.collect()
+        self.assertEqual((stats['replays'], stats['replayed_records']), (1, 11))
+        self.assertEqual(stats['replay_seconds_avg'], stats['replay_seconds'])
+        # Запись журнала — операция плюс seq
+        self.assertGreater(stats['write_amplification'], 1.0)
+        self.assertEqual(stats['write_amplification'], storage.write_amplification())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import hmac
+from flask import Flask, Response, request, abort, jsonify
+from telegram import Update
+from metrics import metrics
+
+
+# ---------- Приём апдейтов через вебхук ----------
+# Telegram присылает апдейт POST-запросом; проверяем секретный заголовок,
+# кладём апдейт в очередь диспетчера и сразу отвечаем 200 — обработка идёт
+# в пуле потоков, HTTP-ответ её не ждёт.
+#
+# Только один процесс: бот — единственный писатель документов, замки
+# document_locks, кэш документов и очередь диспетчера живут в памяти
+# процесса. Два процесса (несколько воркеров gunicorn, два инстанса) будут
+# править один месяц каждый в своей копии, и правки потеряются. WSGI-сервер
+# запускаем с одним воркером и потоками, см. wsgi.py.
+def create_app(dispatcher, secret_token, executor):
+    if not secret_token:
+        raise ValueError('Для вебхука нужен WEBHOOK_SECRET')
+    app = Flask(__name__)
+
+    @app.post('/webhook')
+    def webhook():
+        received = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+        if not hmac.compare_digest(received, secret_token):
+            abort(403)
+        payload = request.get_json(silent=True)
+        if payload is None:
+            abort(400)
+        dispatcher.update_queue.put(Update.de_json(payload, dispatcher.bot))
+        return '', 200
+
+    @app.get('/healthz')
+    def healthz():
+        return jsonify(
+            status='ok',
+            update_queue=dispatcher.update_queue.qsize(),
+            worker_queue=executor.depth(),
+        )
+
+    @app.get('/metrics')
+    def metrics_endpoint():
+        if not metrics.enabled:
+            abort(404)
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    return app
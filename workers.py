@@ -0,0 +1,90 @@
+import queue
+import logging
+import threading
+from contextlib import contextmanager
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# ---------- Блокировки по ключу (документу бюджета) ----------
+# Замок создаётся при первом обращении и удаляется, когда его никто не ждёт.
+class KeyedLocks:
+    def __init__(self):
+        self._locks = {}   # key -> [RLock, сколько потоков держат или ждут]
+        self._guard = threading.Lock()
+
+    @contextmanager
+    def __call__(self, key):
+        with self._guard:
+            slot = self._locks.get(key)
+            if slot is None:
+                slot = self._locks[key] = [threading.RLock(), 0]
+            slot[1] += 1
+        try:
+            with slot[0]:
+                yield
+        finally:
+            with self._guard:
+                slot[1] -= 1
+                if not slot[1]:
+                    del self._locks[key]
+
+
+# ---------- Пул обработчиков ----------
+# Каждый чат закреплён за одним потоком, поэтому сообщения одного чата
+# обрабатываются строго по порядку (смайлик после «расход»), а разные чаты —
+# параллельно. Очередь потока ограничена: при переполнении submit() ждёт,
+# и встаёт только поток Dispatcher. Опрос Telegram (и вебхук) при этом
+# продолжает складывать апдейты в update_queue диспетчера, а она в PTB не
+# ограничена — так что queue_depth ограничивает очереди пула, а не весь
+# бэклог бота. Размер update_queue виден в метриках (dispatcher).
+class ChatExecutor:
+    def __init__(self, workers=8, queue_depth=100):
+        self._queues = [queue.Queue(maxsize=queue_depth) for _ in range(workers)]
+        self._threads = []
+
+    def start(self):
+        for idx, q in enumerate(self._queues):
+            thread = threading.Thread(target=self._run, args=(q,), name=f'chat-worker-{idx}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _run(self, q):
+        while True:
+            task = q.get()
+            try:
+                if task is None:
+                    return
+                fn, args = task
+                fn(*args)
+            except Exception:
+                logger.exception('Ошибка в обработчике')
+                metrics.error('handler')
+            finally:
+                q.task_done()
+
+    def submit(self, key, fn, *args):
+        self._queues[hash(key) % len(self._queues)].put((fn, args))
+
+    def depth(self):
+        return sum(q.qsize() for q in self._queues)
+
+    def join(self):
+        for q in self._queues:
+            q.join()
+
+    def shutdown(self):
+        # Дорабатываем всё, что уже в очередях, и останавливаем потоки
+        for q in self._queues:
+            q.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def wrap(self, handler):
+        # Обработчик для Dispatcher: сразу отдаёт апдейт в пул по chat_id
+        def submit_update(update, context):
+            self.submit(update.effective_chat.id if update.effective_chat else None,
+                        handler, update, context)
+        return submit_update
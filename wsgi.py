@@ -0,0 +1,21 @@
+import atexit
+from bot import create_updater, start_services, stop_services, start_webhook, stop_webhook
+
+
+# ---------- WSGI-приложение для режима вебхука ----------
+# Вместо отладочного сервера Werkzeug из python bot.py:
+#   gunicorn --workers 1 --threads 8 --bind 0.0.0.0:$PORT wsgi:app
+#   waitress-serve --threads 8 --port $PORT wsgi:app
+# Воркер строго один (и без --preload): замки, кэш документов и очередь
+# диспетчера — в памяти процесса, см. webhook.py. Параллельность дают потоки
+# сервера и пул обработчиков бота.
+updater = create_updater()
+start_services(updater.bot)
+app, _dispatcher_thread = start_webhook(updater)
+
+
+@atexit.register
+def _shutdown():
+    # Дорабатываем очереди и выгружаем документы при остановке сервера
+    stop_webhook(updater, _dispatcher_thread)
+    stop_services()
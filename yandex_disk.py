@@ -0,0 +1,61 @@
+import json
+import hashlib
+import requests
+from config import YANDEX_TOKEN, YANDEX_DIR, YANDEX_API_URL
+from metrics import metrics
+
+# Одна сессия на процесс — переиспользуем TLS-соединения с Диском
+session = requests.Session()
+
+
+def _headers():
+    return {'Authorization': f'OAuth {YANDEX_TOKEN}'}
+
+
+# ---------- Сериализация документа ----------
+def encode_document(data):
+    return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+
+def document_md5(payload: bytes):
+    return hashlib.md5(payload).hexdigest()
+
+
+# ---------- Работа с Яндекс.Диском ----------
+def upload_payload(filename, payload: bytes):
+    url = f'{YANDEX_API_URL}/resources/upload?path={YANDEX_DIR}/{filename}&overwrite=true'
+    with metrics.timer('yandex_href'):
+        r = session.get(url, headers=_headers())
+    r.raise_for_status()
+    upload_url = r.json()['href']
+    with metrics.timer('yandex_upload'):
+        session.put(upload_url, data=payload).raise_for_status()
+    return document_md5(payload)
+
+
+def fetch_from_yandex(filename):
+    url = f'{YANDEX_API_URL}/resources/download?path={YANDEX_DIR}/{filename}'
+    with metrics.timer('yandex_href'):
+        r = session.get(url, headers=_headers())
+    # Нет файла — только 404; 401/429/5xx — ошибка, а не пустой месяц
+    if r.status_code == 404:
+        raise FileNotFoundError(filename)
+    r.raise_for_status()
+    download_url = r.json()['href']
+    with metrics.timer('yandex_download'):
+        resp = session.get(download_url)
+        resp.raise_for_status()
+    with metrics.timer('json_parse'):
+        data = json.loads(resp.content)
+    return data, document_md5(resp.content)
+
+
+def stat_yandex(filename):
+    # Только метаданные: md5 содержимого, None — если файла нет
+    url = f'{YANDEX_API_URL}/resources?path={YANDEX_DIR}/{filename}&fields=md5,modified'
+    with metrics.timer('yandex_stat'):
+        r = session.get(url, headers=_headers())
+    if r.status_code == 404:
+        return None
+    r.raise_for_status()
+    return r.json().get('md5')